@@ -1,9 +1,16 @@
+import argparse
 import csv
+import json
+import os
 import numpy as np
 
+from stages import Stages
+
 months = {"jan" : 0,"feb" : 1,"mar" : 2,"apr" : 3,"may" : 4,"june" : 5,
           "jul" : 6,"aug" : 7,"sep" : 8,"oct" : 9,"nov" : 10,"dec" : 11}
 
+STAGE_NAMES = ["load_data", "split", "fit", "predict", "evaluate"]
+
 
 class KNN:
 
@@ -17,10 +24,17 @@ class KNN:
         return np.sqrt(np.sum((x - X)**2))
 
 
+    def k_nearest(self , x):
+        """
+        Return the indices of the k training rows nearest to `x`, nearest first.
+        """
+        neighbours =[self.distance(x,X) for X in self.train_X]
+        return np.argsort(neighbours)[:self.k]
+
+
     def one_predict(self , x):
         
-        neighbours =[self.distance(x,X) for X in self.train_X]
-        Kneighbours = np.argsort(neighbours)[:self.k]
+        Kneighbours = self.k_nearest(x)
         one_count = 0
         zero_count = 0
         for val in Kneighbours:
@@ -40,9 +54,7 @@ class KNN:
 
     
 
-def load_data():
-
-    filename = "Shopping.csv"
+def load_data(filename="shopping.csv"):
 
     # Read data in from file
     with open(filename) as f:
@@ -68,6 +80,89 @@ def load_data():
     raise NotImplementedError
 
 
+def parse_columns(filename):
+    """
+    Parse the CSV `filename` column by column instead of cell by cell.
+    Return a tuple (evidence, labels) with the same columns as `load_data`,
+    where `evidence` is float32 and `labels` is int8.
+    """
+    with open(filename) as f:
+        reader = csv.reader(f)
+        next(reader)
+        columns = list(zip(*reader))
+
+    evidence = np.empty((len(columns[0]), 17), dtype=np.float32)
+
+    # numeric columns are converted by numpy in one pass each
+    for col in (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 11, 12, 13, 14):
+        evidence[:, col] = np.array(columns[col], dtype=np.float32)
+
+    # months only need a lookup per distinct value, not per row
+    names, inverse = np.unique(np.array(columns[10]), return_inverse=True)
+    evidence[:, 10] = np.array([months[name.lower()] for name in names], dtype=np.float32)[inverse]
+
+    evidence[:, 15] = np.char.lower(np.array(columns[15])) == "returning_visitor"
+    evidence[:, 16] = np.char.lower(np.array(columns[16])) == "true"
+    labels = (np.char.lower(np.array(columns[-1])) == "true").astype(np.int8)
+
+    return evidence, labels
+
+
+def load_cached(filename="shopping.csv"):
+    """
+    Load `filename` through a binary cache stored next to it in
+    `filename`.cache/.
+
+    The first call parses the CSV with `parse_columns` and saves the
+    result as .npy files; later calls memory-map those files directly and
+    return them as read-only ndarrays.
+    The cache records the CSV's size and modification time and is rebuilt
+    whenever either changes or a cached array is missing.
+    """
+    cache_dir = f"{filename}.cache"
+    meta_path = os.path.join(cache_dir, "source.json")
+    evidence_path = os.path.join(cache_dir, "evidence.npy")
+    labels_path = os.path.join(cache_dir, "labels.npy")
+
+    stat = os.stat(filename)
+    source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    try:
+        with open(meta_path) as f:
+            fresh = json.load(f) == source
+    except (OSError, ValueError):
+        fresh = False
+    fresh = fresh and os.path.exists(evidence_path) and os.path.exists(labels_path)
+
+    if not fresh:
+        evidence, labels = parse_columns(filename)
+        os.makedirs(cache_dir, exist_ok=True)
+        # written to a temporary file and renamed into place, so another
+        # run that still has the old file memory-mapped keeps reading it
+        for path, array in ((evidence_path, evidence), (labels_path, labels)):
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+        # written last, so an interrupted rebuild is never mistaken for fresh
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(source, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    # np.asarray gives plain ndarray views of the maps, without copying,
+    # so the per-row loops in KNN do not go through the memmap subclass
+    return (np.asarray(np.load(evidence_path, mmap_mode="r")),
+            np.asarray(np.load(labels_path, mmap_mode="r")))
+
+
+
+def split_data(data, labels):
+    """
+    Hold out the first 60% of rows for testing. Return a tuple
+    (train_X, train_Y, test_X, test_Y).
+    """
+    holdout = int(0.60 * len(data))
+    return data[holdout:], labels[holdout:], data[:holdout], labels[:holdout]
+
 
 def compare(A , B):
     correct = 0
@@ -84,27 +179,47 @@ def compare(A , B):
 
 def main():
 
-    data , labels = load_data()
+    # Check command-line arguments
+    parser = argparse.ArgumentParser(usage="python NaiveKNN.py [data]")
+    parser.add_argument("data", nargs="?", default="shopping.csv")
+    parser.add_argument("--report", metavar="FILE",
+                        help="write per-stage time and memory to FILE as JSON")
+    parser.add_argument("--profile-stage", choices=STAGE_NAMES,
+                        help="capture a cProfile of one stage")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="where to write the profile (default: STAGE.prof)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="add each stage's peak tracemalloc memory to the report; slows stages")
+    args = parser.parse_args()
+
+    stages = Stages(args.report is not None, args.profile_stage, args.profile_output, args.trace_memory)
+
+    with stages.stage("load_data"):
+        data , labels = load_cached(args.data)
     
     # spliting data
-    holdout = int(0.60 * len(data))
-    test_X = data[:holdout]
-    train_X = data[holdout:]
-    test_Y = labels[:holdout]
-    train_Y = labels[holdout:]
+    with stages.stage("split"):
+        train_X, train_Y, test_X, test_Y = split_data(data, labels)
 
     #initialising the model
-    model = KNN(train_X , train_Y, 3)
-    predictions = model.predict(test_X)
+    with stages.stage("fit"):
+        model = KNN(train_X , train_Y, 3)
+    with stages.stage("predict"):
+        predictions = model.predict(test_X)
 
     # Comparing the prediction
-    correct , incorrect = compare(predictions , test_Y)
+    with stages.stage("evaluate"):
+        correct , incorrect = compare(predictions , test_Y)
 
     # Print results
     print(f"Results for KNN model")
     print(f"Correct: {correct}")
     print(f"Incorrect: {incorrect}")
     print(f"Accuracy: {100 * correct / (correct + incorrect):.2f}%")
+
+    if args.report:
+        stages.write(args.report)
+        print(f"Stage report written to {args.report}.")
     
 
 if __name__ == "__main__":
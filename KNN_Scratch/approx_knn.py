@@ -0,0 +1,185 @@
+import argparse
+import heapq
+import itertools
+import time
+
+import numpy as np
+
+from NaiveKNN import KNN, load_data, split_data, compare
+
+
+class ApproxKNN(KNN):
+    """
+    Approximate KNN backed by a random projection forest.
+
+    Each of the `n_trees` trees recursively splits the training rows at the
+    median of their projection onto a random direction until at most
+    `leaf_size` rows remain. A query walks all trees at once, always
+    expanding the node whose split it is closest to, and stops once it has
+    gathered `candidates` training rows. Only those candidates are ranked
+    by exact distance.
+
+    More trees (a bigger index) and more candidates raise recall at the
+    cost of build time and query latency respectively.
+    """
+
+    def __init__(self, train_X, Train_Y, k=1, n_trees=8, leaf_size=32, candidates=256, seed=0):
+        super().__init__(train_X, Train_Y, k)
+        self.train_X = np.asarray(train_X, dtype=np.float64)
+        self.n_trees = n_trees
+        self.leaf_size = leaf_size
+        self.candidates = max(candidates, k)
+        self.rng = np.random.default_rng(seed)
+        self.trees = [self._build(np.arange(len(self.train_X))) for _ in range(n_trees)]
+
+
+    def _build(self, indices):
+        """
+        Build a tree over the training rows `indices`.
+
+        Internal nodes are (direction, threshold, left, right) tuples and
+        leaves are index arrays.
+        """
+        if len(indices) <= self.leaf_size:
+            return indices
+
+        # split along the line between two random rows, which follows the
+        # data's scale better than an isotropic random direction
+        a, b = self.train_X[self.rng.choice(indices, 2, replace=False)]
+        direction = a - b
+        if not direction.any():
+            direction = self.rng.normal(size=self.train_X.shape[1])
+
+        projections = self.train_X[indices] @ direction
+        threshold = np.median(projections)
+        left = projections <= threshold
+        if left.all() or not left.any():
+            return indices
+
+        return (direction, threshold, self._build(indices[left]), self._build(indices[~left]))
+
+
+    def index_size(self):
+        """
+        Return the number of nodes (internal and leaf) in the forest.
+        """
+        count = 0
+        stack = list(self.trees)
+        while stack:
+            node = stack.pop()
+            count += 1
+            if isinstance(node, tuple):
+                stack.extend(node[2:])
+        return count
+
+
+    def candidate_indices(self, x):
+        """
+        Return up to `candidates` training row indices near `x`.
+        """
+        # max-heap on the margin between `x` and the splits along each path
+        counter = itertools.count()
+        heap = [(-np.inf, next(counter), tree) for tree in self.trees]
+        found = []
+        total = 0
+
+        while heap and total < self.candidates:
+            margin, _, node = heapq.heappop(heap)
+            margin = -margin
+            if not isinstance(node, tuple):
+                found.append(node)
+                total += len(node)
+                continue
+
+            direction, threshold, left, right = node
+            side = x @ direction - threshold
+            near, far = (left, right) if side <= 0 else (right, left)
+            heapq.heappush(heap, (-margin, next(counter), near))
+            heapq.heappush(heap, (-min(margin, -abs(side)), next(counter), far))
+
+        return np.unique(np.concatenate(found))
+
+
+    def k_nearest(self, x):
+        candidates = self.candidate_indices(x)
+        distances = np.sqrt(np.sum((self.train_X[candidates] - x) ** 2, axis=1))
+        return candidates[np.argsort(distances)[:self.k]]
+
+
+
+def recall_at_k(train_X, test_X, approx, exact):
+    """
+    Return the mean fraction of approximate neighbours that are as close
+    as the k-th exact neighbour. Comparing distances rather than indices
+    keeps duplicate training rows from counting as misses.
+    """
+    hits = []
+    for x, a, e in zip(test_X, approx, exact):
+        kth = np.sqrt(np.sum((train_X[e[-1]] - x) ** 2))
+        distances = np.sqrt(np.sum((train_X[a] - x) ** 2, axis=1))
+        hits.append(np.sum(distances <= kth + 1e-9) / len(e))
+    return sum(hits) / len(hits)
+
+
+def evaluate_approx(model, test_X, test_Y, exact_neighbours, exact_predictions):
+    """
+    Score `model` against the exact KNN results for `test_X`.
+    Return a dict of recall@k, accuracy, agreement with the exact
+    `one_predict` and queries/sec.
+    """
+    start = time.perf_counter()
+    neighbours = [model.k_nearest(x) for x in test_X]
+    elapsed = time.perf_counter() - start
+    predictions = [model.one_predict(x) for x in test_X]
+
+    correct, incorrect = compare(predictions, test_Y)
+    agree, _ = compare(predictions, exact_predictions)
+    return {
+        "recall": recall_at_k(model.train_X, test_X, neighbours, exact_neighbours),
+        "accuracy": correct / (correct + incorrect),
+        "agreement": agree / len(test_X),
+        "qps": len(test_X) / elapsed,
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Approximate KNN recall/latency sweep")
+    parser.add_argument("data", nargs="?", default="shopping.csv")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--trees", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--candidates", type=int, nargs="+", default=[32, 128, 512])
+    parser.add_argument("--leaf-size", type=int, default=32)
+    parser.add_argument("--rows", type=int, default=500,
+                        help="number of test rows to score")
+    args = parser.parse_args()
+
+    data, labels = load_data(args.data)
+    train_X, train_Y, test_X, test_Y = split_data(data, labels)
+    test_X, test_Y = test_X[:args.rows], test_Y[:args.rows]
+
+    # exact reference
+    exact = KNN(train_X, train_Y, args.k)
+    start = time.perf_counter()
+    exact_neighbours = [exact.k_nearest(x) for x in test_X]
+    exact_qps = len(test_X) / (time.perf_counter() - start)
+    exact_predictions = [exact.one_predict(x) for x in test_X]
+    correct, incorrect = compare(exact_predictions, test_Y)
+
+    print(f"Exact KNN: accuracy {100 * correct / (correct + incorrect):.2f}%, {exact_qps:.1f} queries/sec")
+    print(f"{'trees':>5} {'cands':>6} {'nodes':>7} {'build s':>8} {'recall':>7} "
+          f"{'acc %':>6} {'agree %':>8} {'q/s':>9}")
+
+    for n_trees in args.trees:
+        for candidates in args.candidates:
+            start = time.perf_counter()
+            model = ApproxKNN(train_X, train_Y, args.k, n_trees, args.leaf_size, candidates)
+            build = time.perf_counter() - start
+            result = evaluate_approx(model, test_X, test_Y, exact_neighbours, exact_predictions)
+            print(f"{n_trees:>5} {candidates:>6} {model.index_size():>7} {build:>8.3f} "
+                  f"{result['recall']:>7.3f} {100 * result['accuracy']:>6.2f} "
+                  f"{100 * result['agreement']:>8.2f} {result['qps']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import cProfile
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.neighbors import KNeighborsClassifier
+
+from NaiveKNN import KNN, load_data, split_data
+from stages import peak_rss_bytes
+
+
+class NaiveModel:
+    """
+    Adapter giving NaiveKNN's `KNN` the fit/predict interface of sklearn.
+    """
+
+    def __init__(self, k):
+        self.k = k
+
+    def fit(self, X, y):
+        self.model = KNN(X, y, self.k)
+        return self
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+
+MODELS = {
+    "naive": lambda k: NaiveModel(k),
+    "sklearn": lambda k: KNeighborsClassifier(n_neighbors=k),
+}
+
+
+def shopping_dataset(filename):
+    """
+    Return (train_X, train_Y, test_X, test_Y) split the same way as
+    NaiveKNN.main.
+    """
+    return split_data(*load_data(filename))
+
+
+def synthetic_dataset(rows, dims, seed=0):
+    """
+    Return a seeded (train_X, train_Y, test_X, test_Y) split of `rows`
+    gaussian samples in `dims` dimensions, labelled by a noisy random
+    hyperplane.
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, dims))
+    weights = rng.normal(size=dims)
+    y = (X @ weights + rng.normal(scale=0.5, size=rows) > 0).astype(int)
+    split = int(0.60 * rows)
+    return X[:split], y[:split], X[split:], y[split:]
+
+
+def _peak_rss(conn, model_name, k, train_X, train_Y, queries):
+    """
+    Fit and predict in a forked child and send back how far its peak
+    resident memory rose above the resident memory it started with.
+    """
+    start = peak_rss_bytes()
+    MODELS[model_name](k).fit(train_X, train_Y).predict(queries)
+    conn.send(peak_rss_bytes() - start)
+    conn.close()
+
+
+def peak_rss_mb(model_name, k, train_X, train_Y, queries):
+    """
+    Return the peak resident memory in MB that fitting and predicting
+    adds, measured in a child process. Unlike tracemalloc this includes
+    native allocations, such as sklearn's Cython and C++ working memory.
+
+    The child is forked so it inherits the data without pickling it, which
+    needs a platform with the "fork" start method.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise RuntimeError("peak memory is measured in a forked child process, "
+                           "and this platform cannot fork")
+    context = multiprocessing.get_context("fork")
+    receive, send = context.Pipe(duplex=False)
+    child = context.Process(target=_peak_rss, args=(send, model_name, k, train_X, train_Y, queries))
+    child.start()
+    peak = receive.recv()
+    child.join()
+    return peak / 2**20
+
+
+def run(model_name, k, train_X, train_Y, queries, profile_path=None):
+    """
+    Benchmark one model on one dataset.
+
+    Return a dict with fit time, per-query p50/p99 latency, batch
+    throughput and the peak resident memory fitting and predicting add.
+    """
+    start = time.perf_counter()
+    model = MODELS[model_name](k).fit(train_X, train_Y)
+    fit_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.predict(query[None, :])
+        latencies.append(time.perf_counter() - start)
+
+    profiler = cProfile.Profile() if profile_path else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    model.predict(queries)
+    if profiler:
+        profiler.disable()
+    batch_seconds = time.perf_counter() - start
+    if profiler:
+        profiler.dump_stats(profile_path)
+
+    return {
+        "fit_ms": 1000 * fit_seconds,
+        "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "p99_ms": 1000 * float(np.percentile(latencies, 99)),
+        "throughput": len(queries) / batch_seconds,
+        # measured in a separate process, so earlier runs do not hide it
+        "peak_mb": peak_rss_mb(model_name, k, train_X, train_Y, queries),
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="NaiveKNN versus sklearn KNeighborsClassifier")
+    parser.add_argument("--data", default="shopping.csv")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200,
+                        help="test rows timed per dataset")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000, 16000])
+    parser.add_argument("--dims", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--models", nargs="+", choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", metavar="DIR",
+                        help="write a cProfile dump of each batch predict to DIR")
+    args = parser.parse_args()
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        sys.exit("benchmark.py measures peak memory in forked child processes, "
+                 "which this platform does not support")
+
+    datasets = [("shopping", lambda: shopping_dataset(args.data))]
+    for rows in args.sizes:
+        for dims in args.dims:
+            datasets.append((f"synthetic-{rows}x{dims}",
+                             lambda rows=rows, dims=dims: synthetic_dataset(rows, dims, args.seed)))
+
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+
+    print(f"{'dataset':<22} {'model':<8} {'train':>6} {'fit ms':>8} {'p50 ms':>8} "
+          f"{'p99 ms':>8} {'rows/s':>10} {'peak RSS MB':>12}")
+    for name, make in datasets:
+        train_X, train_Y, test_X, _ = make()
+        queries = np.asarray(test_X[:args.queries])
+        for model_name in args.models:
+            profile_path = None
+            if args.profile:
+                profile_path = os.path.join(args.profile, f"{name}-{model_name}.prof")
+            result = run(model_name, args.k, train_X, train_Y, queries, profile_path)
+            print(f"{name:<22} {model_name:<8} {len(train_X):>6} {result['fit_ms']:>8.2f} "
+                  f"{result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+                  f"{result['throughput']:>10.1f} {result['peak_mb']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import time
+
+import numpy as np
+
+from NaiveKNN import load_cached, split_data
+
+CHUNK_SIZE = 256
+
+
+def standardize(train_X, test_X):
+    """
+    Scale every feature to zero mean and unit variance using the training
+    set's statistics. Constant features are left unscaled.
+    """
+    mean = train_X.mean(axis=0)
+    std = train_X.std(axis=0)
+    std[std == 0] = 1
+    return (train_X - mean) / std, (test_X - mean) / std
+
+
+def sorted_neighbours(train_X, test_X, k, chunk_size=CHUNK_SIZE):
+    """
+    Return an array with, for every row of `test_X`, the indices of its `k`
+    nearest training rows sorted nearest first.
+
+    Distances are computed for `chunk_size` test rows at a time, so memory
+    grows with chunk_size x len(train_X) rather than the full test set.
+    """
+    train_X = np.asarray(train_X, dtype=np.float64)
+    train_norms = np.sum(train_X ** 2, axis=1)
+    neighbours = np.empty((len(test_X), k), dtype=np.intp)
+
+    for start in range(0, len(test_X), chunk_size):
+        queries = np.asarray(test_X[start:start + chunk_size], dtype=np.float64)
+        # squared euclidean distance; the ranking is the same as with sqrt
+        distances = train_norms - 2 * queries @ train_X.T + np.sum(queries ** 2, axis=1)[:, None]
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1, kind="stable")
+        neighbours[start:start + len(queries)] = np.take_along_axis(nearest, order, axis=1)
+
+    return neighbours
+
+
+def score(labels, predictions):
+    """
+    Return a tuple (accuracy, sensitivity, specificity) for 0/1 arrays.
+    """
+    positives = labels == 1
+    negatives = ~positives
+    accuracy = np.mean(labels == predictions)
+    sensitivity = np.mean(predictions[positives] == 1) if positives.any() else 0.0
+    specificity = np.mean(predictions[negatives] == 0) if negatives.any() else 0.0
+    return float(accuracy), float(sensitivity), float(specificity)
+
+
+def sweep_k(train_X, train_Y, test_X, test_Y, k_max, standardize_features=False):
+    """
+    Evaluate KNN for every k from 1 to `k_max` with one neighbour search.
+
+    The `k_max` nearest neighbours of each test row are found once. A
+    running count of positive labels along the sorted lists then gives
+    the majority vote for every smaller k, using the same rule as
+    `KNN.one_predict` (ties predict 0).
+
+    Return a tuple (rows, search_seconds) where `rows` is a list of dicts
+    with keys k, accuracy, sensitivity, specificity and seconds (the time
+    to score that k from the shared neighbour lists).
+    """
+    train_X = np.asarray(train_X, dtype=np.float64)
+    test_X = np.asarray(test_X, dtype=np.float64)
+    train_Y = np.asarray(train_Y)
+    test_Y = np.asarray(test_Y)
+    k_max = min(k_max, len(train_X))
+
+    start = time.perf_counter()
+    if standardize_features:
+        train_X, test_X = standardize(train_X, test_X)
+    neighbours = sorted_neighbours(train_X, test_X, k_max)
+    ones = np.cumsum(train_Y[neighbours] == 1, axis=1)
+    search_seconds = time.perf_counter() - start
+
+    rows = []
+    for k in range(1, k_max + 1):
+        start = time.perf_counter()
+        predictions = (2 * ones[:, k - 1] > k).astype(int)
+        accuracy, sensitivity, specificity = score(test_Y, predictions)
+        rows.append({
+            "k": k,
+            "accuracy": accuracy,
+            "sensitivity": sensitivity,
+            "specificity": specificity,
+            "seconds": time.perf_counter() - start,
+        })
+
+    return rows, search_seconds
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Evaluate KNN for k = 1..k_max in one pass")
+    parser.add_argument("data", nargs="?", default="shopping.csv")
+    parser.add_argument("--k-max", type=int, default=25)
+    parser.add_argument("--standardize", action="store_true",
+                        help="scale features to zero mean and unit variance")
+    args = parser.parse_args()
+
+    data, labels = load_cached(args.data)
+    train_X, train_Y, test_X, test_Y = split_data(data, labels)
+
+    rows, search_seconds = sweep_k(train_X, train_Y, test_X, test_Y, args.k_max, args.standardize)
+
+    print(f"Neighbour search for k_max={args.k_max}: {search_seconds:.3f}s")
+    print(f"{'k':>3} {'accuracy':>9} {'TPR':>7} {'TNR':>7} {'ms':>7}")
+    for row in rows:
+        print(f"{row['k']:>3} {100 * row['accuracy']:>8.2f}% {100 * row['sensitivity']:>6.2f}% "
+              f"{100 * row['specificity']:>6.2f}% {1000 * row['seconds']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
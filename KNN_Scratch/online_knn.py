@@ -0,0 +1,219 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from NaiveKNN import load_cached, split_data, compare
+from approx_knn import ApproxKNN
+
+REBUILD_THRESHOLD = 1000
+
+
+class OnlineKNN:
+    """
+    KNN that keeps learning while it serves predictions.
+
+    Training rows live in two places: a main index built over everything
+    seen up to the last rebuild, and an append-only buffer of newer rows.
+    `add` only copies into the buffer, which grows by doubling like a
+    list. Queries search the index, brute-force the buffer and merge the
+    two candidate lists. Once the buffer holds `rebuild_threshold` rows a
+    background thread builds a new index over index + buffer and swaps it
+    in, so prediction never waits on a rebuild.
+
+    `index_factory(train_X, train_Y, k)` must return an object with
+    `train_X`, `train_Y` and a `k_nearest(x)` method, such as `KNN` or
+    `ApproxKNN`.
+    """
+
+    def __init__(self, train_X, Train_Y, k=1, rebuild_threshold=REBUILD_THRESHOLD, index_factory=ApproxKNN):
+        self.k = k
+        self.rebuild_threshold = rebuild_threshold
+        self.index_factory = index_factory
+        self.index = index_factory(np.asarray(train_X, dtype=np.float64), np.asarray(Train_Y), k)
+        self.rebuilds = 0
+
+        self._lock = threading.Lock()
+        self._buffer_X = np.empty((rebuild_threshold, self.index.train_X.shape[1]), dtype=np.float64)
+        self._buffer_Y = np.empty(rebuild_threshold, dtype=np.asarray(Train_Y).dtype)
+        self._size = 0
+        self._rebuild = None
+
+
+    def add(self, samples, labels):
+        """
+        Append labeled `samples` to the buffer, starting a background
+        rebuild if the buffer has reached the threshold.
+        """
+        samples = np.atleast_2d(np.asarray(samples, dtype=np.float64))
+        labels = np.atleast_1d(np.asarray(labels))
+
+        with self._lock:
+            end = self._size + len(samples)
+            if end > len(self._buffer_X):
+                self._grow(end)
+            self._buffer_X[self._size:end] = samples
+            self._buffer_Y[self._size:end] = labels
+            # publish the rows only once they are fully written
+            self._size = end
+            self._maybe_rebuild()
+
+
+    def _maybe_rebuild(self):
+        """
+        Start a background rebuild if the buffer is full and none is
+        running. Must be called with the lock held.
+        """
+        if self._size >= self.rebuild_threshold and self._rebuild is None:
+            self._rebuild = threading.Thread(target=self._rebuild_index, daemon=True)
+            self._rebuild.start()
+
+
+    def _grow(self, needed):
+        """
+        Move the buffer to arrays of at least `needed` rows, doubling the
+        capacity. Must be called with the lock held.
+        """
+        capacity = max(needed, 2 * len(self._buffer_X))
+        buffer_X = np.empty((capacity, self._buffer_X.shape[1]), dtype=self._buffer_X.dtype)
+        buffer_Y = np.empty(capacity, dtype=self._buffer_Y.dtype)
+        buffer_X[:self._size] = self._buffer_X[:self._size]
+        buffer_Y[:self._size] = self._buffer_Y[:self._size]
+        self._buffer_X, self._buffer_Y = buffer_X, buffer_Y
+
+
+    def _rebuild_index(self):
+        """
+        Build a new index over the current index and buffered rows, then
+        swap it in and drop the rows it absorbed from the buffer.
+        """
+        with self._lock:
+            index = self.index
+            absorbed = self._size
+            new_X = self._buffer_X[:absorbed]
+            new_Y = self._buffer_Y[:absorbed]
+
+        # rows below `absorbed` are never written again, so they can be
+        # read without the lock while new rows keep arriving
+        train_X = np.concatenate([index.train_X, new_X])
+        train_Y = np.concatenate([index.train_Y, new_Y])
+        rebuilt = self.index_factory(train_X, train_Y, self.k)
+
+        with self._lock:
+            # queries may still hold views of the old buffer, so the rows
+            # that arrived during the rebuild are copied to fresh arrays
+            remaining = self._size - absorbed
+            capacity = max(self.rebuild_threshold, remaining)
+            buffer_X = np.empty((capacity, self._buffer_X.shape[1]), dtype=self._buffer_X.dtype)
+            buffer_Y = np.empty(capacity, dtype=self._buffer_Y.dtype)
+            buffer_X[:remaining] = self._buffer_X[absorbed:self._size]
+            buffer_Y[:remaining] = self._buffer_Y[absorbed:self._size]
+
+            self.index = rebuilt
+            self._buffer_X, self._buffer_Y = buffer_X, buffer_Y
+            self._size = remaining
+            self.rebuilds += 1
+            self._rebuild = None
+            self._maybe_rebuild()
+
+
+    def wait(self):
+        """
+        Block until background rebuilds have finished.
+        """
+        rebuild = self._rebuild
+        while rebuild is not None:
+            rebuild.join()
+            rebuild = self._rebuild
+
+
+    def buffered(self):
+        """
+        Return the number of rows not yet in the main index.
+        """
+        return self._size
+
+
+    def nearest(self, x):
+        """
+        Return a tuple (distances, labels) of the k nearest rows to `x`
+        across the main index and the buffer, nearest first. Unlike
+        `KNN.k_nearest` it returns labels, not indices, since buffered
+        rows have no index in `train_X`.
+        """
+        with self._lock:
+            index = self.index
+            buffer_X = self._buffer_X[:self._size]
+            buffer_Y = self._buffer_Y[:self._size]
+
+        indices = index.k_nearest(x)
+        distances = np.sqrt(np.sum((index.train_X[indices] - x) ** 2, axis=1))
+        labels = np.asarray(index.train_Y)[indices]
+
+        if len(buffer_X):
+            buffer_distances = np.sqrt(np.sum((buffer_X - x) ** 2, axis=1))
+            distances = np.concatenate([distances, buffer_distances])
+            labels = np.concatenate([labels, buffer_Y])
+
+        nearest = np.argsort(distances, kind="stable")[:self.k]
+        return distances[nearest], labels[nearest]
+
+
+    def one_predict(self, x):
+        _, labels = self.nearest(np.asarray(x, dtype=np.float64))
+        one_count = int(np.sum(labels == 1))
+        zero_count = len(labels) - one_count
+        return 1 if (one_count > zero_count) else 0
+
+
+    def predict(self, test_X):
+        return [self.one_predict(x) for x in test_X]
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Stream shopping data into an OnlineKNN")
+    parser.add_argument("data", nargs="?", default="shopping.csv")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=250,
+                        help="rows added per streaming step")
+    parser.add_argument("--threshold", type=int, default=REBUILD_THRESHOLD)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    data, labels = load_cached(args.data)
+
+    train_X, train_Y, test_X, test_Y = split_data(data, labels)
+
+    # streaming the training rows in after an initial tenth
+    test_X = np.asarray(test_X[:args.queries], dtype=np.float64)
+    test_Y = test_Y[:args.queries]
+    train_X = np.asarray(train_X, dtype=np.float64)
+    train_Y = np.asarray(train_Y)
+    initial = len(train_X) // 10
+
+    model = OnlineKNN(train_X[:initial], train_Y[:initial], args.k, args.threshold)
+
+    print(f"{'rows':>6} {'buffered':>9} {'rebuilds':>9} {'p50 ms':>8} {'p99 ms':>8} {'accuracy':>9}")
+    for start in range(initial, len(train_X), args.batch):
+        model.add(train_X[start:start + args.batch], train_Y[start:start + args.batch])
+
+        latencies = []
+        predictions = []
+        for x in test_X:
+            begin = time.perf_counter()
+            predictions.append(model.one_predict(x))
+            latencies.append(time.perf_counter() - begin)
+
+        correct, incorrect = compare(predictions, test_Y)
+        print(f"{min(start + args.batch, len(train_X)):>6} {model.buffered():>9} {model.rebuilds:>9} "
+              f"{1000 * np.percentile(latencies, 50):>8.3f} {1000 * np.percentile(latencies, 99):>8.3f} "
+              f"{100 * correct / (correct + incorrect):>8.2f}%")
+
+    model.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from NaiveKNN import KNN, load_data, split_data, compare
+
+# Per-worker state, filled in once by `_init_worker`
+_worker = {}
+
+
+def share_array(array):
+    """
+    Copy `array` into a new shared memory block.
+
+    Return a tuple (block, spec) where `spec` is the picklable
+    (name, shape, dtype) triple workers use to attach to the block.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[:] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def attach_array(spec):
+    """
+    Attach to a shared memory block described by `spec`.
+    Return a tuple (block, array) - keep `block` alive while using `array`.
+    """
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _init_worker(train_X_spec, train_Y_spec, test_X_spec, k):
+    """
+    Attach a worker process to the shared train/test arrays and build its
+    model once, so tasks only carry row ranges.
+    """
+    blocks = []
+    arrays = []
+    for spec in (train_X_spec, train_Y_spec, test_X_spec):
+        block, array = attach_array(spec)
+        blocks.append(block)
+        arrays.append(array)
+
+    train_X, train_Y, test_X = arrays
+    _worker["blocks"] = blocks
+    _worker["model"] = KNN(train_X, train_Y, k)
+    _worker["test_X"] = test_X
+
+
+def _predict_range(bounds):
+    """
+    Predict test rows `start` to `stop` of the shared test matrix.
+    """
+    start, stop = bounds
+    return _worker["model"].predict(_worker["test_X"][start:stop])
+
+
+def chunk_bounds(n, chunks):
+    """
+    Split `n` rows into at most `chunks` contiguous (start, stop) ranges.
+    """
+    size = max(1, math.ceil(n / max(1, chunks)))
+    return [(start, min(start + size, n)) for start in range(0, n, size)]
+
+
+def parallel_predict(train_X, train_Y, test_X, k=1, workers=None, chunks_per_worker=4):
+    """
+    Predict every row of `test_X` with `KNN(train_X, train_Y, k)` using
+    `workers` processes.
+
+    The training and test matrices are placed in shared memory once and
+    workers attach to them, instead of every task pickling `train_X`.
+    Test rows are split into `chunks_per_worker` chunks per worker so that
+    slow chunks do not leave other workers idle. Predictions come back in
+    the same order as `test_X`.
+    """
+    workers = workers or os.cpu_count() or 1
+    train_X = np.ascontiguousarray(train_X)
+    train_Y = np.ascontiguousarray(train_Y)
+    test_X = np.ascontiguousarray(test_X)
+
+    blocks = []
+    try:
+        specs = []
+        for array in (train_X, train_Y, test_X):
+            block, spec = share_array(array)
+            blocks.append(block)
+            specs.append(spec)
+
+        bounds = chunk_bounds(len(test_X), workers * chunks_per_worker)
+        predictions = []
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(*specs, k)
+        ) as executor:
+            for chunk in executor.map(_predict_range, bounds):
+                predictions.extend(chunk)
+        return predictions
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def speedup_curve(train_X, train_Y, test_X, k=1, worker_counts=(1, 2, 4)):
+    """
+    Time `parallel_predict` for each entry of `worker_counts` against the
+    serial `KNN.predict` baseline.
+
+    Return a tuple (curve, predictions), where `curve` is a list of
+    (workers, seconds, speedup) tuples with the serial run reported as
+    0 workers.
+    """
+    start = time.perf_counter()
+    expected = KNN(train_X, train_Y, k).predict(test_X)
+    serial = time.perf_counter() - start
+    curve = [(0, serial, 1.0)]
+
+    for workers in worker_counts:
+        start = time.perf_counter()
+        predictions = parallel_predict(train_X, train_Y, test_X, k, workers)
+        elapsed = time.perf_counter() - start
+        if predictions != expected:
+            raise Exception(f"Parallel predictions differ with {workers} workers")
+        curve.append((workers, elapsed, serial / elapsed))
+
+    return curve, expected
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Parallel NaiveKNN speedup curve")
+    parser.add_argument("data", nargs="?", default="shopping.csv")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--rows", type=int, default=None,
+                        help="only predict the first ROWS test rows")
+    args = parser.parse_args()
+
+    data, labels = load_data(args.data)
+    train_X, train_Y, test_X, test_Y = split_data(data, labels)
+    test_X, test_Y = test_X[:args.rows], test_Y[:args.rows]
+
+    curve, predictions = speedup_curve(train_X, train_Y, test_X, args.k, args.workers)
+
+    print(f"Predicting {len(test_X)} rows against {len(train_X)} training rows (k={args.k})")
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8}")
+    for workers, seconds, speedup in curve:
+        label = "serial" if workers == 0 else workers
+        print(f"{label:>8} {seconds:>10.3f} {speedup:>7.2f}x")
+
+    correct, incorrect = compare(predictions, test_Y)
+    print(f"Accuracy: {100 * correct / (correct + incorrect):.2f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import heapq
+import sys
+import time
+
+import numpy as np
+
+from NaiveKNN import KNN, load_data, split_data, compare
+
+CHUNK_SIZE = 4096
+QUERY_BATCH = 32
+
+
+def save_training_set(prefix, train_X, train_Y):
+    """
+    Write `train_X` and `train_Y` to `prefix`_X.npy and `prefix`_Y.npy so
+    they can be memory-mapped later with `open_training_set`.
+    """
+    np.save(f"{prefix}_X.npy", np.asarray(train_X))
+    np.save(f"{prefix}_Y.npy", np.asarray(train_Y))
+
+
+def open_training_set(prefix):
+    """
+    Memory-map a training set written by `save_training_set`.
+    Return a tuple (train_X, train_Y) of read-only memmaps.
+    """
+    train_X = np.load(f"{prefix}_X.npy", mmap_mode="r")
+    train_Y = np.load(f"{prefix}_Y.npy", mmap_mode="r")
+    return train_X, train_Y
+
+
+class StreamingKNN(KNN):
+    """
+    KNN over a training matrix that does not fit in memory.
+
+    `train_X` may be any array-like supporting row slicing, typically a
+    memmap from `open_training_set`. It is scanned `chunk_size` rows at a
+    time and every query keeps a running top-k heap that is merged with
+    the candidates of each chunk, so memory stays bounded by
+    `chunk_size` x `query_batch` regardless of the training set size.
+    """
+
+    def __init__(self, train_X, Train_Y, k=1, chunk_size=CHUNK_SIZE, query_batch=QUERY_BATCH):
+        super().__init__(train_X, Train_Y, k)
+        self.chunk_size = chunk_size
+        self.query_batch = query_batch
+
+
+    def kneighbours(self, test_X):
+        """
+        Return a list with, for every row of `test_X`, the (distance, index)
+        pairs of its k nearest training rows, nearest first.
+        """
+        neighbours = []
+        for start in range(0, len(test_X), self.query_batch):
+            queries = np.asarray(test_X[start:start + self.query_batch], dtype=np.float64)
+            neighbours.extend(self._scan(queries))
+        return neighbours
+
+
+    def _scan(self, queries):
+        """
+        Scan the whole training set once for a batch of `queries`.
+        """
+        # max-heaps of (-distance, -index) holding the k best so far
+        heaps = [[] for _ in queries]
+
+        for offset in range(0, len(self.train_X), self.chunk_size):
+            chunk = np.asarray(self.train_X[offset:offset + self.chunk_size], dtype=np.float64)
+            distances = np.sqrt(np.sum((queries[:, None, :] - chunk[None, :, :]) ** 2, axis=2))
+
+            # only the k best of this chunk can enter a query's heap
+            k = min(self.k, len(chunk))
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+
+            for heap, row, cols in zip(heaps, distances, candidates):
+                for col in cols:
+                    item = (-row[col], -(offset + col))
+                    if len(heap) < self.k:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+
+        return [sorted((-d, -i) for d, i in heap) for heap in heaps]
+
+
+    def one_predict(self, x):
+        return self.predict([x])[0]
+
+
+    def predict(self, test_X):
+        predictions = []
+        for neighbours in self.kneighbours(test_X):
+            indices = [index for _, index in neighbours]
+            one_count = int(np.sum(np.asarray(self.train_Y[indices]) == 1))
+            zero_count = len(indices) - one_count
+            predictions.append(1 if (one_count > zero_count) else 0)
+
+        return predictions
+
+
+
+def main():
+
+    # Check command-line arguments
+    if len(sys.argv) not in [1, 2, 3]:
+        sys.exit("Usage: python streaming_knn.py [prefix] [data]")
+    prefix = sys.argv[1] if len(sys.argv) >= 2 else "shopping_train"
+    filename = sys.argv[2] if len(sys.argv) == 3 else "shopping.csv"
+
+    data, labels = load_data(filename)
+    train_X, train_Y, test_X, test_Y = split_data(data, labels)
+
+    # the training set only goes through memory once, to write it to disk
+    save_training_set(prefix, train_X, train_Y)
+    train_X, train_Y = open_training_set(prefix)
+
+    model = StreamingKNN(train_X, train_Y, 3)
+    start = time.perf_counter()
+    predictions = model.predict(test_X)
+    elapsed = time.perf_counter() - start
+
+    correct, incorrect = compare(predictions, test_Y)
+
+    print(f"Results for streaming KNN model ({len(train_X)} rows memory-mapped from {prefix}_X.npy)")
+    print(f"Correct: {correct}")
+    print(f"Incorrect: {incorrect}")
+    print(f"Accuracy: {100 * correct / (correct + incorrect):.2f}%")
+    print(f"Queries/sec: {len(test_X) / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
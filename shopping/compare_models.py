@@ -0,0 +1,99 @@
+import argparse
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from shopping import ESTIMATORS, TEST_SIZE, load_data, evaluate, make_estimator
+
+# Per-worker dataset, loaded once by `_init_worker`
+_worker = {}
+
+
+def _init_worker(filename):
+    """
+    Load the dataset once per worker process.
+    """
+    evidence, labels = load_data(filename)
+    _worker["evidence"] = np.array(evidence)
+    _worker["labels"] = np.array(labels)
+
+
+def run_trial(name, seed):
+    """
+    Fit estimator `name` on the split given by `seed` and evaluate it.
+    Return a dict of metrics for this single trial.
+    """
+    X_train, X_test, y_train, y_test = train_test_split(
+        _worker["evidence"], _worker["labels"], test_size=TEST_SIZE, random_state=seed
+    )
+
+    model = make_estimator(name)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = model.predict(X_test)
+    predict_seconds = time.perf_counter() - start
+
+    sensitivity, specificity = evaluate(y_test, predictions)
+    return {
+        "model": name,
+        "seed": seed,
+        "sensitivity": sensitivity,
+        "specificity": specificity,
+        "fit_seconds": fit_seconds,
+        "rows_per_second": len(X_test) / predict_seconds,
+        "model_bytes": len(pickle.dumps(model)),
+    }
+
+
+def compare_models(filename, names, seeds, workers=None):
+    """
+    Train and evaluate every estimator in `names` on every split in `seeds`
+    in parallel worker processes.
+
+    Return a dict mapping each name to its metrics averaged over the
+    splits, in the order of `names`.
+    """
+    trials = [(name, seed) for name in names for seed in seeds]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(filename,)
+    ) as executor:
+        results = list(executor.map(run_trial, *zip(*trials)))
+
+    summary = {}
+    for name in names:
+        runs = [result for result in results if result["model"] == name]
+        summary[name] = {
+            key: float(np.mean([run[key] for run in runs]))
+            for key in ("sensitivity", "specificity", "fit_seconds", "rows_per_second", "model_bytes")
+        }
+    return summary
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Compare shopping estimators in parallel")
+    parser.add_argument("data")
+    parser.add_argument("--models", nargs="+", choices=ESTIMATORS, default=ESTIMATORS)
+    parser.add_argument("--splits", type=int, default=3,
+                        help="number of seeded train/test splits per model")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    summary = compare_models(args.data, args.models, range(args.splits), args.workers)
+
+    print(f"{'model':<11} {'TPR':>7} {'TNR':>7} {'fit ms':>9} {'rows/s':>11} {'size KB':>9}")
+    for name, metrics in summary.items():
+        print(f"{name:<11} {100 * metrics['sensitivity']:>6.2f}% {100 * metrics['specificity']:>6.2f}% "
+              f"{1000 * metrics['fit_seconds']:>9.2f} {metrics['rows_per_second']:>11.0f} "
+              f"{metrics['model_bytes'] / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import collections
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from shopping import CHUNK_SIZE, encode_row, load_model
+
+# Per-worker model, loaded once by `_init_worker`
+_worker = {}
+
+
+def _init_worker(model_file):
+    """
+    Load the saved model once per worker process.
+    """
+    _worker["model"] = load_model(model_file)
+
+
+def score_rows(rows):
+    """
+    Encode CSV `rows` like `load_data` and return their predictions.
+    """
+    evidence = np.array([encode_row(row) for row in rows], dtype=np.float64)
+    return _worker["model"].predict(evidence)
+
+
+def read_chunks(reader, chunk_size):
+    """
+    Yield lists of at most `chunk_size` rows from a CSV `reader`.
+    """
+    while True:
+        rows = list(itertools.islice(reader, chunk_size))
+        if not rows:
+            return
+        yield rows
+
+
+def score_file(model_file, input_file, output_file, chunk_size=CHUNK_SIZE, workers=None):
+    """
+    Stream `input_file` through the model saved in `model_file` and write
+    one prediction per row to `output_file`, in input order.
+
+    Chunks are scored in a pool of `workers` processes that each load the
+    model once. At most two chunks per worker are in flight, so memory
+    stays bounded however large the input is. Return the number of rows
+    scored.
+    """
+    workers = workers or os.cpu_count() or 1
+    scored = 0
+
+    with open(input_file) as f_in, open(output_file, "w", newline="") as f_out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(model_file,)) as executor:
+        reader = csv.reader(f_in)
+        next(reader)
+        writer = csv.writer(f_out)
+        writer.writerow(["Prediction"])
+
+        pending = collections.deque()
+        for rows in read_chunks(reader, chunk_size):
+            pending.append(executor.submit(score_rows, rows))
+            if len(pending) >= 2 * workers:
+                predictions = pending.popleft().result()
+                writer.writerows([int(p)] for p in predictions)
+                scored += len(predictions)
+
+        while pending:
+            predictions = pending.popleft().result()
+            writer.writerows([int(p)] for p in predictions)
+            scored += len(predictions)
+
+    return scored
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Score a CSV of sessions with a saved shopping model")
+    parser.add_argument("model", help="model saved by `python shopping.py data model.pkl`")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    scored = score_file(args.model, args.input, args.output, args.chunk_size, args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"Scored {scored} rows in {elapsed:.2f}s ({scored / elapsed:.0f} rows/sec)")
+    print(f"Predictions written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import argparse
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from shopping import load_data, evaluate, make_estimator
+
+# Parameter grids for the estimators `shopping.make_estimator` builds. A
+# list holds several grids, so parameters are only combined where they
+# matter: Perceptron's `alpha` has no effect without a penalty
+SEARCH_SPACE = {
+    "nb": {"var_smoothing": [1e-9, 1e-7, 1e-5, 1e-3]},
+    "perceptron": [
+        {"penalty": [None], "class_weight": [None, "balanced"]},
+        {"penalty": ["l2"], "alpha": [1e-4, 1e-3], "class_weight": [None, "balanced"]},
+    ],
+    "svc": {
+        "C": [0.1, 1, 10],
+        "class_weight": [None, "balanced"],
+    },
+    "knn": {
+        "n_neighbors": [1, 3, 5, 9, 15],
+        "weights": ["uniform", "distance"],
+    },
+}
+
+# Estimators that depend on feature scale are fit on standardized evidence
+SCALED = {"perceptron", "svc", "knn"}
+
+# Per-worker views of the shared arrays, attached by `_init_worker`
+_worker = {}
+
+
+def configurations(names):
+    """
+    Return every (name, params) pair in the grids of estimators `names`.
+    """
+    configs = []
+    for name in names:
+        grids = SEARCH_SPACE[name]
+        for grid in grids if isinstance(grids, list) else [grids]:
+            for values in itertools.product(*grid.values()):
+                configs.append((name, dict(zip(grid, values))))
+    return configs
+
+
+def build_estimator(name, params):
+    """
+    Return estimator `name` with `params` set, behind a StandardScaler if
+    it is in `SCALED`.
+    """
+    model = make_estimator(name).set_params(**params)
+    if name in SCALED:
+        return make_pipeline(StandardScaler(), model)
+    return model
+
+
+def share_array(array):
+    """
+    Copy `array` into shared memory. Return a tuple (block, spec) where
+    `spec` is the (name, shape, dtype) triple workers attach with.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _init_worker(specs):
+    """
+    Attach a worker process to the shared evidence, labels, fold ids and
+    row order.
+    """
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _worker[key + "_block"] = block
+        _worker[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def run_trial(name, params, budget):
+    """
+    Cross-validate one configuration using a `budget` fraction of every
+    fold's training rows. Return a tuple (sensitivity, specificity)
+    averaged over the folds.
+    """
+    evidence, labels = _worker["evidence"], _worker["labels"]
+    folds, order = _worker["folds"], _worker["order"]
+
+    scores = []
+    for fold in range(folds.max() + 1):
+        # `order` is one shuffled permutation shared by every trial, so a
+        # bigger budget always trains on a superset of the smaller one
+        train = order[folds[order] != fold]
+        train = train[:max(2, math.ceil(budget * len(train)))]
+        test = folds == fold
+
+        model = build_estimator(name, params)
+        model.fit(evidence[train], labels[train])
+        scores.append(evaluate(labels[test], model.predict(evidence[test])))
+
+    return tuple(float(np.mean(values)) for values in zip(*scores))
+
+
+def rank_key(result):
+    """
+    Sort key ranking results by balanced accuracy, then sensitivity.
+    """
+    sensitivity, specificity = result["sensitivity"], result["specificity"]
+    return ((sensitivity + specificity) / 2, sensitivity)
+
+
+def successive_halving(filename, names, n_folds=3, min_budget=1 / 9, eta=3, workers=None, seed=0):
+    """
+    Search the grids of estimators `names` with successive halving.
+
+    The data is encoded and split into `n_folds` stratified folds once and
+    placed in shared memory for the worker processes. Every surviving
+    configuration is cross-validated on a fraction of the training rows
+    that starts at `min_budget` and grows by `eta` each round, keeping the
+    best 1/`eta` by `evaluate`'s sensitivity and specificity.
+
+    The leader of every earlier round is scored again on the full budget
+    and ranked with the final round, so a configuration that led on a
+    small budget is not lost, and every result is compared on the same
+    budget.
+
+    Return a tuple (results, rounds): `results` holds the full-budget
+    results, best first, and `rounds` lists (budget, configurations) per
+    round.
+    """
+    evidence, labels = load_data(filename)
+    evidence = np.array(evidence, dtype=np.float64)
+    labels = np.array(labels, dtype=np.int64)
+
+    folds = np.empty(len(labels), dtype=np.int64)
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    for fold, (_, test) in enumerate(splitter.split(evidence, labels)):
+        folds[test] = fold
+    order = np.random.default_rng(seed).permutation(len(labels))
+
+    blocks = []
+    try:
+        specs = {}
+        for key, array in (("evidence", evidence), ("labels", labels), ("folds", folds), ("order", order)):
+            block, specs[key] = share_array(array)
+            blocks.append(block)
+
+        configs = configurations(names)
+        rounds = []
+        leaders = []
+        budget = min_budget
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(specs,)
+        ) as executor:
+
+            def score(configs, budget):
+                scores = executor.map(
+                    run_trial, *zip(*[(name, params, budget) for name, params in configs])
+                )
+                return [
+                    {"model": name, "params": params, "sensitivity": sensitivity, "specificity": specificity}
+                    for (name, params), (sensitivity, specificity) in zip(configs, scores)
+                ]
+
+            while True:
+                # a lone survivor has nothing left to race, so it goes
+                # straight to the full budget
+                budget = 1.0 if len(configs) == 1 else min(budget, 1.0)
+                results = sorted(score(configs, budget), key=rank_key, reverse=True)
+                rounds.append((budget, len(configs)))
+
+                if budget >= 1.0:
+                    # earlier leaders that were dropped, rescored at full budget
+                    dropped = [leader for leader in leaders if leader not in configs]
+                    if dropped:
+                        results = sorted(results + score(dropped, 1.0), key=rank_key, reverse=True)
+                    return results, rounds
+
+                leader = (results[0]["model"], results[0]["params"])
+                if leader not in leaders:
+                    leaders.append(leader)
+                keep = max(1, len(configs) // eta)
+                configs = [(result["model"], result["params"]) for result in results[:keep]]
+                budget *= eta
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Successive-halving search over shopping estimators")
+    parser.add_argument("data")
+    parser.add_argument("--models", nargs="+", choices=sorted(SEARCH_SPACE), default=sorted(SEARCH_SPACE))
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--min-budget", type=float, default=1 / 9,
+                        help="fraction of training rows in the first round")
+    parser.add_argument("--eta", type=int, default=3, help="keep 1/eta configurations per round")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results, rounds = successive_halving(
+        args.data, args.models, args.folds, args.min_budget, args.eta, args.workers, args.seed
+    )
+
+    for budget, count in rounds:
+        print(f"Budget {100 * budget:5.1f}% of training rows: {count} configurations")
+    print()
+    print(f"{'model':<11} {'TPR':>7} {'TNR':>7}  params")
+    for result in results:
+        print(f"{result['model']:<11} {100 * result['sensitivity']:>6.2f}% "
+              f"{100 * result['specificity']:>6.2f}%  {result['params']}")
+
+
+if __name__ == "__main__":
+    main()
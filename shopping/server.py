@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from shopping import encode_row, load_data, load_model, train_model
+
+HOST = "127.0.0.1"
+PORT = 8765
+BATCH_WINDOW = 0.002
+MAX_BATCH = 256
+
+
+class MicroBatcher:
+    """
+    Collect concurrent prediction requests into one `model.predict` call.
+
+    The first request of a batch opens a window of `window` seconds; every
+    request that arrives before it closes, up to `max_batch`, is predicted
+    together. Under light load a request waits at most `window`, and under
+    heavy load the per-call overhead of `predict` is shared by the batch.
+    """
+
+    def __init__(self, model, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.model = model
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.requests = 0
+
+
+    async def predict(self, features):
+        """
+        Queue one feature vector and wait for its prediction.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((features, future))
+        return await future
+
+
+    async def run(self):
+        """
+        Serve queued requests in batches until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # callers that were cancelled while queued no longer want an answer
+            batch = [(features, future) for features, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                predictions = self.model.predict(np.array([features for features, _ in batch]))
+            except Exception:
+                # retry one by one, so only the row that fails gets the error
+                self.predict_each(batch)
+                continue
+
+            self.batches += 1
+            self.requests += len(batch)
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(int(prediction))
+
+
+    def predict_each(self, batch):
+        for features, future in batch:
+            try:
+                prediction = self.model.predict(np.array([features]))[0]
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                self.batches += 1
+                self.requests += 1
+                if not future.done():
+                    future.set_result(int(prediction))
+
+
+def parse_request(line):
+    """
+    Return the evidence for one JSON request line as a float array of
+    shape (17,), raising ValueError if the request cannot be encoded, so
+    a malformed request is rejected before it can join a batch.
+
+    A request holds either "features", the 17 values already encoded as
+    in `load_data`, or "row", the raw CSV fields of a session.
+    """
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object")
+    if "row" in request:
+        row = request["row"]
+        if not (isinstance(row, list) and len(row) >= 17 and all(isinstance(field, str) for field in row[:17])):
+            raise ValueError("row must be a list of at least 17 CSV fields as strings")
+        try:
+            features = encode_row(row)
+        except (KeyError, ValueError) as error:
+            raise ValueError(f"row cannot be encoded: {error}")
+    elif "features" in request:
+        features = request["features"]
+    else:
+        raise ValueError('request must hold "features" or "row"')
+    features = np.asarray(features, dtype=float)
+    if features.shape != (17,):
+        raise ValueError("features must be a list of 17 numbers")
+    if not np.isfinite(features).all():
+        raise ValueError("features must be finite")
+    return features
+
+
+async def handle(batcher, reader, writer):
+    """
+    Answer newline-delimited JSON requests on one connection.
+    """
+    try:
+        while line := await reader.readline():
+            try:
+                prediction = await batcher.predict(parse_request(line))
+                response = {"prediction": prediction}
+            except (ValueError, KeyError, IndexError, TypeError) as error:
+                response = {"error": str(error)}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_server(model, host=HOST, port=PORT, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+    """
+    Start serving `model` on `host`:`port`.
+    Return a tuple (server, batcher, batcher_task).
+    """
+    batcher = MicroBatcher(model, window, max_batch)
+    task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(
+        lambda reader, writer: handle(batcher, reader, writer), host, port
+    )
+    return server, batcher, task
+
+
+async def generate_load(host, port, samples, clients, requests):
+    """
+    Open `clients` connections that each send `requests` requests, one at
+    a time, drawn from `samples`. Return a tuple (latencies, seconds).
+    """
+    latencies = []
+
+    async def client(offset):
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in range(requests):
+            features = samples[(offset + i) % len(samples)]
+            start = time.perf_counter()
+            writer.write(json.dumps({"features": features}).encode() + b"\n")
+            await writer.drain()
+            json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c * requests) for c in range(clients)))
+    return latencies, time.perf_counter() - start
+
+
+def malformed_requests(row):
+    """
+    Return requests that must each get an error response, built from the
+    valid CSV `row`.
+    """
+    weekend_bool = list(row)
+    weekend_bool[16] = True
+    unknown_month = list(row)
+    unknown_month[10] = "Smarch"
+    return [
+        {"row": weekend_bool},
+        {"row": unknown_month},
+        {"row": row[:5]},
+        {"row": "not a list"},
+        {"features": ["abc"] * 17},
+        {"features": [[1]] * 17},
+        {"features": [float("nan")] * 17},
+        {},
+        [1, 2, 3],
+    ]
+
+
+async def check(args):
+    """
+    Send every malformed request and then a valid one on one connection,
+    and fail unless each malformed request gets an error and the
+    connection still answers the valid request.
+    """
+    with open(args.data) as f:
+        f.readline()
+        row = f.readline().strip().split(",")
+
+    server, _, task = await start_server(get_model(args), args.host, 0, args.window / 1000, args.max_batch)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection(args.host, port)
+        responses = []
+        for request in malformed_requests(row) + [{"row": row}]:
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            responses.append(json.loads(await reader.readline() or "null"))
+        writer.close()
+        await writer.wait_closed()
+    task.cancel()
+
+    *errors, valid = responses
+    for request, response in zip(malformed_requests(row), errors):
+        if not (response and "error" in response):
+            raise Exception(f"{request} got {response} instead of an error")
+    if not (valid and "prediction" in valid):
+        raise Exception(f"valid request got {valid} after the malformed ones")
+    print(f"{len(errors)} malformed requests rejected, connection still serving")
+
+
+def get_model(args):
+    """
+    Load the model from --model, or train one on --data with `train_model`.
+    """
+    if args.model:
+        return load_model(args.model)
+    evidence, labels = load_data(args.data)
+    return train_model(evidence, labels)
+
+
+async def serve(args):
+    server, _, _ = await start_server(get_model(args), args.host, args.port,
+                                      args.window / 1000, args.max_batch)
+    print(f"Serving on {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+async def bench(args):
+    evidence, _ = load_data(args.data)
+    server, batcher, task = await start_server(get_model(args), args.host, 0,
+                                               args.window / 1000, args.max_batch)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        latencies, seconds = await generate_load(args.host, port, evidence, args.clients, args.requests)
+    task.cancel()
+
+    print(f"{len(latencies)} requests from {args.clients} clients in {seconds:.2f}s")
+    print(f"Throughput: {len(latencies) / seconds:.0f} requests/sec")
+    print(f"Latency p50: {1000 * np.percentile(latencies, 50):.3f} ms")
+    print(f"Latency p99: {1000 * np.percentile(latencies, 99):.3f} ms")
+    print(f"Mean batch size: {batcher.requests / max(batcher.batches, 1):.1f}")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Micro-batching prediction server for shopping models")
+    parser.add_argument("command", choices=["serve", "bench", "check"])
+    parser.add_argument("--model", help="model saved by `python shopping.py data model.pkl`")
+    parser.add_argument("--data", default="shopping.csv",
+                        help="training data when no --model is given, and bench request samples")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--window", type=float, default=1000 * BATCH_WINDOW,
+                        help="batching window in milliseconds")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--clients", type=int, default=32, help="bench: concurrent connections")
+    parser.add_argument("--requests", type=int, default=200, help="bench: requests per connection")
+    args = parser.parse_args()
+
+    asyncio.run({"serve": serve, "bench": bench, "check": check}[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,72 @@
+import argparse
 import csv
-import sys
+import itertools
+import pickle
 
-from sklearn.model_selection import train_test_split
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.linear_model import Perceptron
-from sklearn.naive_bayes import GaussianNB
-from sklearn import svm
+from stages import Stages
+
+# numpy and sklearn are imported inside the functions that use them, so a
+# usage error or a scoring-only import does not pay for loading them
 
 TEST_SIZE = 0.4
+CHUNK_SIZE = 10000
+STAGE_NAMES = ["load_data", "train_test_split", "fit", "predict", "evaluate"]
+
+# The estimators `make_estimator` builds, by name
+ESTIMATORS = ["knn", "nb", "perceptron", "svc"]
+
+MONTHS = {
+    "jan" : 0,
+    "feb" : 1,
+    "mar" : 2,
+    "apr" : 3,
+    "may" : 4,
+    "june" : 5,
+    "jul" : 6,
+    "aug" : 7,
+    "sep" : 8,
+    "oct" : 9,
+    "nov" : 10,
+    "dec" : 11
+}
 
 
 def main():
 
     # Check command-line arguments
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python shopping.py data")
+    parser = argparse.ArgumentParser(usage="python shopping.py data [model.pkl]")
+    parser.add_argument("data")
+    parser.add_argument("model", nargs="?")
+    parser.add_argument("--estimator", choices=ESTIMATORS, default="nb")
+    parser.add_argument("--report", metavar="FILE",
+                        help="write per-stage time and memory to FILE as JSON")
+    parser.add_argument("--profile-stage", choices=STAGE_NAMES,
+                        help="capture a cProfile of one stage")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="where to write the profile (default: STAGE.prof)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="add each stage's peak tracemalloc memory to the report; slows stages")
+    args = parser.parse_args()
+
+    from sklearn.model_selection import train_test_split
+
+    stages = Stages(args.report is not None, args.profile_stage, args.profile_output, args.trace_memory)
 
     # Load data from spreadsheet and split into train and test sets
-    evidence, labels = load_data(sys.argv[1])
-    X_train, X_test, y_train, y_test = train_test_split(
-        evidence, labels, test_size=TEST_SIZE
-    )
+    with stages.stage("load_data"):
+        evidence, labels = load_data(args.data)
+    with stages.stage("train_test_split"):
+        X_train, X_test, y_train, y_test = train_test_split(
+            evidence, labels, test_size=TEST_SIZE
+        )
 
     # Train model and make predictions
-    model = train_model(X_train, y_train)
-    predictions = model.predict(X_test)
-    sensitivity, specificity = evaluate(y_test, predictions)
+    with stages.stage("fit"):
+        model = train_model(X_train, y_train, args.estimator)
+    with stages.stage("predict"):
+        predictions = model.predict(X_test)
+    with stages.stage("evaluate"):
+        sensitivity, specificity = evaluate(y_test, predictions)
 
     # Print results
     print(f"Correct: {(y_test == predictions).sum()}")
@@ -33,6 +74,15 @@ def main():
     print(f"True Positive Rate: {100 * sensitivity:.2f}%")
     print(f"True Negative Rate: {100 * specificity:.2f}%")
 
+    # Save model to file
+    if args.model:
+        save_model(model, args.model)
+        print(f"Model saved to {args.model}.")
+
+    if args.report:
+        stages.write(args.report)
+        print(f"Stage report written to {args.report}.")
+
 
 def load_data(filename):
     """
@@ -67,45 +117,11 @@ def load_data(filename):
     with open(filename) as f:
         reader = csv.reader(f)
         next(reader)
-        months = {
-            "jan" : 0,
-            "feb" : 1,
-            "mar" : 2,
-            "apr" : 3,
-            "may" : 4,
-            "june" : 5,
-            "jul" : 6,
-            "aug" : 7,
-            "sep" : 8,
-            "oct" : 9,
-            "nov" : 10,
-            "dec" : 11
-        }
         evidence = list()
         labels = list()
         for row in reader:
-            
-            evidence.append([
-                int(row[0]),
-                float(row[1]),
-                int(row[2]),
-                float(row[3]),
-                int(row[4]),
-                float(row[5]),
-                float(row[6]),
-                float(row[7]),
-                float(row[8]),
-                float(row[9]),
-                int(months[row[10].lower()]),
-                int(row[11]),
-                int(row[12]),
-                int(row[13]),
-                int(row[14]),
-                int(1 if row[15].lower() == "returning_visitor" else 0),
-                int(1 if row[16].lower() == "true" else 0)
-            ])
-
-            labels.append(int(1 if row[-1].lower() == "true" else 0))
+            evidence.append(encode_row(row))
+            labels.append(encode_label(row))
 
     # X_training, X_testing, y_training, y_testing = train_test_split(
     #     evidence, labels, test_size=0.4
@@ -115,16 +131,87 @@ def load_data(filename):
     raise NotImplementedError
 
 
-def train_model(evidence, labels):
+def encode_row(row):
     """
-    Given a list of evidence lists and a list of labels, return a
-    fitted k-nearest neighbor model (k=1) trained on the data.
+    Convert one CSV `row` into the evidence list described in `load_data`.
     """
+    return [
+        int(row[0]),
+        float(row[1]),
+        int(row[2]),
+        float(row[3]),
+        int(row[4]),
+        float(row[5]),
+        float(row[6]),
+        float(row[7]),
+        float(row[8]),
+        float(row[9]),
+        int(MONTHS[row[10].lower()]),
+        int(row[11]),
+        int(row[12]),
+        int(row[13]),
+        int(row[14]),
+        int(1 if row[15].lower() == "returning_visitor" else 0),
+        int(1 if row[16].lower() == "true" else 0)
+    ]
+
+
+def encode_label(row):
+    """
+    Return 1 if the CSV `row`'s Revenue is true, and 0 otherwise.
+    """
+    return int(1 if row[-1].lower() == "true" else 0)
+
+
+def load_chunks(filename, chunk_size=CHUNK_SIZE):
+    """
+    Read the CSV `filename` in chunks of at most `chunk_size` rows.
+
+    Yield tuples (evidence, labels) of NumPy arrays encoded the same way
+    as `load_data`, so only one chunk is ever held in memory.
+    """
+    import numpy as np
+
+    with open(filename) as f:
+        reader = csv.reader(f)
+        next(reader)
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                return
+            evidence = np.array([encode_row(row) for row in rows], dtype=np.float64)
+            labels = np.array([encode_label(row) for row in rows], dtype=np.int64)
+            yield evidence, labels
 
-    # model = Perceptron()
-    # model = svm.SVC()
-    # model = KNeighborsClassifier(n_neighbors=1)
-    model = GaussianNB()
+
+def make_estimator(name):
+    """
+    Return a new, unfitted estimator by `name`, one of ESTIMATORS:
+    "nb" (Gaussian naive Bayes), "perceptron", "svc" or "knn" (k=1).
+    Only the sklearn module of that estimator is imported.
+    """
+    if name == "nb":
+        from sklearn.naive_bayes import GaussianNB
+        return GaussianNB()
+    if name == "perceptron":
+        from sklearn.linear_model import Perceptron
+        return Perceptron()
+    if name == "svc":
+        from sklearn import svm
+        return svm.SVC()
+    if name == "knn":
+        from sklearn.neighbors import KNeighborsClassifier
+        return KNeighborsClassifier(n_neighbors=1)
+    raise ValueError(f"unknown estimator {name!r}")
+
+
+def train_model(evidence, labels, estimator="nb"):
+    """
+    Given a list of evidence lists and a list of labels, return a
+    fitted model trained on the data. `estimator` picks the model by
+    name, see `make_estimator`.
+    """
+    model = make_estimator(estimator)
 
     # Fit model
     model.fit(evidence, labels)
@@ -133,6 +220,23 @@ def train_model(evidence, labels):
     raise NotImplementedError
 
 
+def save_model(model, filename):
+    """
+    Write a fitted `model` to `filename` so it can be scored without
+    retraining.
+    """
+    with open(filename, "wb") as f:
+        pickle.dump(model, f)
+
+
+def load_model(filename):
+    """
+    Return the model saved to `filename` by `save_model`.
+    """
+    with open(filename, "rb") as f:
+        return pickle.load(f)
+
+
 def evaluate(labels, predictions):
     """
     Given a list of actual labels and a list of predicted labels,
@@ -0,0 +1,119 @@
+import contextlib
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+
+# Shared no-op context, so disabled instrumentation allocates nothing
+_DISABLED = contextlib.nullcontext()
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident memory of this process in bytes, or None
+    where the `resource` module is not available, as on Windows.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else 1024 * peak
+
+
+class Stages:
+    """
+    Per-stage timing and memory instrumentation for a pipeline.
+
+    Wrap each stage in `with stages.stage("name"):` to record its wall
+    time, CPU time and the process's peak resident memory so far, which
+    costs nothing to read. Peak memory is left out where the platform
+    cannot report it. When `enabled` is False every stage is the same
+    shared no-op context, so instrumentation can stay in the code at no
+    measurable cost. Setting `profile_stage` also captures a cProfile of
+    that stage into `profile_output`.
+
+    With `trace_memory`, each stage also records the peak memory traced by
+    tracemalloc while it ran. Tracing hooks every allocation and slows
+    stages unevenly, so it is off by default, and the profiled stage is
+    never traced.
+
+    Stages should not be nested: each one restarts memory tracing.
+    """
+
+    def __init__(self, enabled=False, profile_stage=None, profile_output=None, trace_memory=False):
+        self.enabled = enabled
+        self.profile_stage = profile_stage
+        self.profile_output = profile_output or f"{profile_stage}.prof"
+        self.trace_memory = trace_memory
+        self.records = []
+
+
+    def stage(self, name):
+        """
+        Return a context manager that records stage `name`.
+        """
+        if not (self.enabled or name == self.profile_stage):
+            return _DISABLED
+        return self._record(name)
+
+
+    @contextlib.contextmanager
+    def _record(self, name):
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        traced = self.enabled and self.trace_memory and not profiler
+        if traced:
+            tracemalloc.start()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if traced:
+                peak_traced = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if self.enabled:
+                record = {
+                    "stage": name,
+                    "wall_seconds": wall,
+                    "cpu_seconds": cpu,
+                }
+                max_rss = peak_rss_bytes()
+                if max_rss is not None:
+                    record["max_rss_bytes"] = max_rss
+                if self.trace_memory:
+                    record["peak_traced_bytes"] = peak_traced if traced else None
+                self.records.append(record)
+            if profiler:
+                profiler.dump_stats(self.profile_output)
+
+
+    def report(self):
+        """
+        Return the recorded stages and their totals as a dict.
+        """
+        report = {
+            "stages": self.records,
+            "total_wall_seconds": sum(record["wall_seconds"] for record in self.records),
+            "total_cpu_seconds": sum(record["cpu_seconds"] for record in self.records),
+        }
+        max_rss = [record["max_rss_bytes"] for record in self.records if "max_rss_bytes" in record]
+        if max_rss:
+            report["max_rss_bytes"] = max(max_rss)
+        return report
+
+
+    def write(self, filename):
+        """
+        Write `report()` to `filename` as JSON.
+        """
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=2)
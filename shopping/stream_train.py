@@ -0,0 +1,97 @@
+import argparse
+import time
+
+import numpy as np
+from sklearn.linear_model import Perceptron
+from sklearn.naive_bayes import GaussianNB
+
+from shopping import CHUNK_SIZE, TEST_SIZE, load_chunks
+from stages import peak_rss_bytes
+
+# Estimators that can learn one chunk at a time with `partial_fit`
+STREAMING_ESTIMATORS = {
+    "nb": lambda: GaussianNB(),
+    "perceptron": lambda: Perceptron(),
+}
+CLASSES = np.array([0, 1])
+
+
+def held_out_chunks(filename, chunk_size, seed):
+    """
+    Yield (evidence, labels, held_out) for every chunk of `filename`, where
+    `held_out` marks the rows reserved for evaluation.
+
+    The mask comes from a generator seeded with `seed`, so every pass over
+    the file holds out exactly the same rows without storing them.
+    """
+    rng = np.random.default_rng(seed)
+    for evidence, labels in load_chunks(filename, chunk_size):
+        yield evidence, labels, rng.random(len(labels)) < TEST_SIZE
+
+
+def stream_train(filename, name, chunk_size=CHUNK_SIZE, seed=0):
+    """
+    Train estimator `name` with `partial_fit` over the training rows of
+    `filename`, one chunk at a time. Return the fitted model and the
+    number of rows it was trained on.
+    """
+    model = STREAMING_ESTIMATORS[name]()
+    trained = 0
+    for evidence, labels, held_out in held_out_chunks(filename, chunk_size, seed):
+        train = ~held_out
+        if train.any():
+            model.partial_fit(evidence[train], labels[train], classes=CLASSES)
+            trained += int(train.sum())
+    return model, trained
+
+
+def stream_evaluate(model, filename, chunk_size=CHUNK_SIZE, seed=0):
+    """
+    Predict the held-out rows of `filename` chunk by chunk, keeping only
+    running counts. Return a tuple (sensitivity, specificity, rows).
+    """
+    positives = negatives = true_positives = true_negatives = 0
+    for evidence, labels, held_out in held_out_chunks(filename, chunk_size, seed):
+        if not held_out.any():
+            continue
+        actual = labels[held_out]
+        predictions = model.predict(evidence[held_out])
+        positives += int(np.sum(actual == 1))
+        negatives += int(np.sum(actual == 0))
+        true_positives += int(np.sum((actual == 1) & (predictions == 1)))
+        true_negatives += int(np.sum((actual == 0) & (predictions == 0)))
+
+    sensitivity = true_positives / positives if positives else 0.0
+    specificity = true_negatives / negatives if negatives else 0.0
+    return sensitivity, specificity, positives + negatives
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Train shopping models chunk by chunk")
+    parser.add_argument("data")
+    parser.add_argument("--model", choices=sorted(STREAMING_ESTIMATORS), default="nb")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model, trained = stream_train(args.data, args.model, args.chunk_size, args.seed)
+    train_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sensitivity, specificity, tested = stream_evaluate(model, args.data, args.chunk_size, args.seed)
+    test_seconds = time.perf_counter() - start
+
+    peak = peak_rss_bytes()
+
+    print(f"Trained on {trained} rows in {train_seconds:.2f}s ({trained / train_seconds:.0f} rows/sec)")
+    print(f"Evaluated {tested} held-out rows in {test_seconds:.2f}s")
+    print(f"True Positive Rate: {100 * sensitivity:.2f}%")
+    print(f"True Negative Rate: {100 * specificity:.2f}%")
+    if peak is not None:
+        print(f"Peak memory: {peak / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
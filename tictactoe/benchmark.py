@@ -0,0 +1,111 @@
+"""
+Times minimax with and without the transposition table, and the
+bitboard engine
+
+Usage: python benchmark.py
+"""
+
+import time
+
+import tictactoe as ttt
+
+X, O, EMPTY = ttt.X, ttt.O, ttt.EMPTY
+
+POSITIONS = {
+    "empty": ttt.initial_state(),
+    "X corner": [[X, EMPTY, EMPTY], [EMPTY, EMPTY, EMPTY], [EMPTY, EMPTY, EMPTY]],
+    "X center": [[EMPTY, EMPTY, EMPTY], [EMPTY, X, EMPTY], [EMPTY, EMPTY, EMPTY]],
+    "X corner, O center": [[X, EMPTY, EMPTY], [EMPTY, O, EMPTY], [EMPTY, EMPTY, EMPTY]],
+}
+
+nodes = 0
+
+
+def counting(search):
+    def counted(board):
+        global nodes
+        nodes += 1
+        return search(board)
+    return counted
+
+
+# count every position visited, whether or not the table already has it
+ttt.min_player = counting(ttt.min_player)
+ttt.max_player = counting(ttt.max_player)
+
+
+def solve(board):
+    """
+    Returns the value of the board and the nodes visited and the seconds
+    taken to find it.
+    """
+    global nodes
+    nodes = 0
+    search = ttt.max_player if ttt.player(board) == X else ttt.min_player
+    start = time.perf_counter()
+    value = search(board)
+    return value, nodes, time.perf_counter() - start
+
+
+def bitboard_solve(board):
+    """
+    Same as `solve`, searching the bitboard engine from a cold cache.
+    """
+    ttt.bitboard_value.cache_clear()
+    x, o = ttt.to_bitboard(board)
+    start = time.perf_counter()
+    if ttt.player(board) == X:
+        value = ttt.bitboard_value(x, o)
+    else:
+        value = -ttt.bitboard_value(o, x)
+    seconds = time.perf_counter() - start
+    info = ttt.bitboard_value.cache_info()
+    return value, info.hits + info.misses, seconds
+
+
+def play(board, minimax=ttt.minimax):
+    """
+    Plays `minimax` against itself from the board and returns the seconds
+    taken per move.
+    """
+    times = []
+    while not ttt.terminal(board):
+        start = time.perf_counter()
+        move = minimax(board)
+        times.append(time.perf_counter() - start)
+        board = ttt.result(board, move)
+    return sum(times) / len(times)
+
+
+def main():
+    engines = (
+        ("no table", lambda: None),
+        ("table", ttt.TranspositionTable),
+    )
+
+    print(f"{'position':<20} {'engine':<10} {'value':>5} {'nodes':>8} {'solve ms':>9} {'ms/move':>8} {'hit rate':>9}")
+    for name, board in POSITIONS.items():
+        for engine, make_table in engines:
+            ttt.table = make_table()
+            value, visited, seconds = solve(board)
+            hit_rate = f"{100 * ttt.table.hit_rate():.1f}%" if ttt.table is not None else "-"
+
+            # a fresh table per game, kept from move to move as in runner.py
+            ttt.table = make_table()
+            per_move = play(board)
+
+            print(f"{name:<20} {engine:<10} {value:>5} {visited:>8} {1000 * seconds:>9.1f} "
+                  f"{1000 * per_move:>8.1f} {hit_rate:>9}")
+
+        value, visited, seconds = bitboard_solve(board)
+        hit_rate = ttt.bitboard_value.cache_info().hits / visited
+
+        ttt.bitboard_value.cache_clear()
+        per_move = play(board, ttt.bitboard_minimax)
+
+        print(f"{name:<20} {'bitboard':<10} {value:>5} {visited:>8} {1000 * seconds:>9.1f} "
+              f"{1000 * per_move:>8.1f} {100 * hit_rate:>8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,95 @@ Tic Tac Toe Player
 
 import math
 import copy
+import functools
 from random import randint
 X = "X"
 O = "O"
 EMPTY = None
 
+
+class TranspositionTable:
+    """
+    Cache of solved positions, shared by `min_player` and `max_player` so
+    a position reached by different move orders is only searched once.
+
+    Keys are immutable board encodings from `board_key`. With `max_size`
+    set, the oldest entry is evicted once the table is full.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.entries = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Returns the value stored for `key`, or None if there is none.
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.max_size is not None and key not in self.entries:
+            if self.max_size <= 0:
+                return
+            if len(self.entries) >= self.max_size:
+                # dicts keep insertion order, so the first key is the oldest
+                del self.entries[next(iter(self.entries))]
+        self.entries[key] = value
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"size": len(self), "hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate()}
+
+    def clear(self):
+        """
+        Removes every entry and resets the hit and miss counts.
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Positions solved so far. Set to None to search without a table
+table = TranspositionTable()
+
+
+def board_key(board):
+    """
+    Returns an immutable encoding of the board: a tuple of its 9 cells.
+    """
+    return tuple(cell for row in board for cell in row)
+
+
+def transposition(search):
+    """
+    Looks positions up in `table` before searching them with `search`.
+    Searched positions are stored with the value `search` returns.
+    """
+    @functools.wraps(search)
+    def cached(board):
+        if table is None:
+            return search(board)
+        key = (search.__name__, board_key(board))
+        value = table.get(key)
+        if value is None:
+            value = search(board)
+            table.put(key, value)
+        return value
+    return cached
+
 def initial_state():
     """
     Returns starting state of the board.
@@ -117,6 +201,7 @@ def utility(board):
 
     raise NotImplementedError
 
+@transposition
 def min_player(board):
     """
     Return Minimum possible utility with current board
@@ -136,6 +221,7 @@ def min_player(board):
     #return minimum utility
     return val
 
+@transposition
 def max_player(board):
     """
     Return Maximum possible utility with current board
@@ -213,3 +299,116 @@ def minimax(board):
         return move
     
     raise NotImplementedError
+
+
+# Bitboard engine
+#
+# A board is two 9-bit integers, one per player, where bit 3 * i + j is
+# set if that player has a mark in cell (i, j). Moves set a bit instead of
+# copying the board, and whose turn it is never needs recounting: the
+# search always passes the player to move first.
+
+FULL = 0b111111111
+
+# Bit masks of the 3 rows, 3 columns and 2 diagonals
+LINES = tuple(
+    sum(1 << (3 * i + j) for i, j in line)
+    for line in (
+        [[(i, j) for j in range(3)] for i in range(3)]
+        + [[(i, j) for i in range(3)] for j in range(3)]
+        + [[(i, i) for i in range(3)], [(i, 2 - i) for i in range(3)]]
+    )
+)
+
+
+def to_bitboard(board):
+    """
+    Returns tuple (x, o) of bitboards for a list-of-lists board.
+    """
+    x = o = 0
+    for i in range(3):
+        for j in range(3):
+            if board[i][j] == X:
+                x |= 1 << (3 * i + j)
+            elif board[i][j] == O:
+                o |= 1 << (3 * i + j)
+    return (x, o)
+
+
+def from_bitboard(x, o):
+    """
+    Returns the list-of-lists board for bitboards x and o.
+    """
+    return [[X if x >> (3 * i + j) & 1 else O if o >> (3 * i + j) & 1 else EMPTY
+             for j in range(3)]
+            for i in range(3)]
+
+
+def has_line(bits):
+    """
+    Returns True if the marks in `bits` complete a row, column or diagonal.
+    """
+    for line in LINES:
+        if bits & line == line:
+            return True
+    return False
+
+
+def bitboard_moves(x, o):
+    """
+    Yields the bit of every empty cell, lowest first.
+    """
+    empty = ~(x | o) & FULL
+    while empty:
+        bit = empty & -empty  # lowest set bit
+        yield bit
+        empty ^= bit
+
+
+@functools.lru_cache(maxsize=None)
+def bitboard_value(me, them):
+    """
+    Returns the utility of the position for the player to move, whose
+    marks are `me`: 1 if they win with best play, -1 if they lose and 0
+    for a tie.
+    """
+    # Only the player who just moved can have completed a line
+    if has_line(them):
+        return -1
+    if me | them == FULL:
+        return 0
+
+    val = -1
+    for bit in bitboard_moves(me, them):
+        val = max(val, -bitboard_value(them, me | bit))
+        #pruning
+        if val == 1:
+            break
+    return val
+
+
+def bitboard_minimax(board):
+    """
+    Returns the optimal action (i, j) for the current player on the
+    board, like `minimax`, searching the bitboard engine.
+    """
+    x, o = to_bitboard(board)
+    if has_line(x) or has_line(o) or x | o == FULL:
+        return None
+
+    #first move - Random, as in minimax
+    if not x | o:
+        return (randint(0, 2), randint(0, 2))
+
+    # X moves whenever both players have made the same number of moves
+    me, them = (x, o) if bin(x).count("1") == bin(o).count("1") else (o, x)
+
+    move, best = None, -math.inf
+    for bit in bitboard_moves(me, them):
+        val = -bitboard_value(them, me | bit)
+        if val > best:
+            best, move = val, bit
+            if best == 1:
+                break
+
+    return divmod(move.bit_length() - 1, 3)
@@ -0,0 +1,147 @@
+import argparse
+import os
+import sys
+
+from export import benchmark, compiled_predict_one
+from traffic import EPOCHS, NUM_CATEGORIES, TEST_SIZE, get_model, load_data, read_split, split_indices, write_split
+
+TEMPERATURE = 2.0
+ALPHA = 0.5
+
+
+def soften(probabilities, temperature):
+    """
+    Return `probabilities` re-normalised at `temperature`. The models end
+    in a softmax, so their log-probabilities stand in for the logits.
+    """
+    import numpy as np
+
+    logits = np.log(np.clip(probabilities, 1e-7, 1.0)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    soft = np.exp(logits)
+    return soft / soft.sum(axis=1, keepdims=True)
+
+
+def distillation_loss(temperature=TEMPERATURE, alpha=ALPHA):
+    """
+    Return a Keras loss for a student whose `y_true` is the one-hot label
+    followed by the teacher's probabilities softened at `temperature`.
+
+    The loss is `alpha` times the cross-entropy with the hard label plus
+    `1 - alpha` times the KL divergence from the softened teacher to the
+    softened student, scaled by `temperature ** 2` so its gradients keep
+    the same magnitude as the temperature changes.
+    """
+    import tensorflow as tf
+
+    def loss(y_true, y_pred):
+        hard, soft = y_true[:, :NUM_CATEGORIES], y_true[:, NUM_CATEGORIES:]
+        y_pred = tf.clip_by_value(y_pred, 1e-7, 1.0)
+        student_log_soft = tf.nn.log_softmax(tf.math.log(y_pred) / temperature)
+
+        hard_loss = -tf.reduce_sum(hard * tf.math.log(y_pred), axis=1)
+        soft_loss = tf.reduce_sum(soft * (tf.math.log(tf.maximum(soft, 1e-7)) - student_log_soft), axis=1)
+        return alpha * hard_loss + (1 - alpha) * temperature ** 2 * soft_loss
+
+    return loss
+
+
+def distill(teacher, student, x_train, y_train, epochs=EPOCHS, temperature=TEMPERATURE, alpha=ALPHA,
+            batch_size=32):
+    """
+    Train `student` on `x_train` from the one-hot labels `y_train` and the
+    soft targets of `teacher`, then recompile it with the plain
+    categorical cross-entropy so it saves and evaluates like any model
+    from `get_model`.
+    """
+    import numpy as np
+
+    soft = soften(teacher.predict(x_train, batch_size=256, verbose=0), temperature)
+    targets = np.concatenate([y_train, soft], axis=1)
+
+    student.compile(optimizer="adam", loss=distillation_loss(temperature, alpha))
+    student.fit(x_train, targets, epochs=epochs, batch_size=batch_size)
+    student.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+    return student
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Distill a traffic model into a compact student")
+    parser.add_argument("data_directory")
+    parser.add_argument("--teacher", default="teacher.h5",
+                        help="teacher model trained by traffic.py or distill.py with the same data and --seed; "
+                             "trained with get_model and saved here if it does not exist")
+    parser.add_argument("--output", default="student.h5", help="where to save the student")
+    parser.add_argument("--cache", metavar="DIR", help="load images from uint8 shards in DIR, see shards.py")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--temperature", type=float, default=TEMPERATURE)
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="weight of the hard-label loss")
+    parser.add_argument("--filters", type=int, default=8, help="student filters in the first block")
+    parser.add_argument("--hidden", type=int, default=0, help="student hidden units, 0 for none")
+    parser.add_argument("--conv-layers", type=int, default=2, help="student convolutional blocks")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import numpy as np
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(args.seed)
+
+    if args.cache:
+        from shards import build_shards, load_shards
+        build_shards(args.data_directory, args.cache)
+        images, labels = load_shards(args.cache)
+    else:
+        images, labels = load_data(args.data_directory)
+
+    # The seeded split shared with traffic.py, so a saved teacher is only
+    # reused when its recorded split is this one
+    split = {"seed": args.seed, "test_size": TEST_SIZE, "images": len(labels)}
+    images = np.asarray(images)
+    labels = tf.keras.utils.to_categorical(labels, NUM_CATEGORIES)
+    train, test = split_indices(len(labels), TEST_SIZE, args.seed)
+    x_train, x_test, y_train, y_test = images[train], images[test], labels[train], labels[test]
+
+    if os.path.exists(args.teacher):
+        if read_split(args.teacher) != split:
+            sys.exit(f"{args.teacher} was not trained on this split ({split}), so it would be scored "
+                     f"on its own training images; pass a new --teacher path to train one")
+        teacher = tf.keras.models.load_model(args.teacher)
+        print(f"Loaded teacher from {args.teacher}.")
+    else:
+        teacher = get_model()
+        teacher.fit(x_train, y_train, epochs=args.epochs)
+        teacher.save(args.teacher)
+        write_split(args.teacher, len(labels), TEST_SIZE, args.seed)
+        print(f"Teacher saved to {args.teacher}.")
+
+    student = get_model(filters=args.filters, hidden=args.hidden, conv_layers=args.conv_layers)
+    distill(teacher, student, x_train, y_train, args.epochs, args.temperature, args.alpha)
+    student.save(args.output)
+    write_split(args.output, len(labels), TEST_SIZE, args.seed)
+    print(f"Student saved to {args.output}.")
+
+    test_labels = y_test.argmax(axis=1)
+    results = {}
+    for name, model, path in (("teacher", teacher, args.teacher), ("student", student, args.output)):
+        results[name] = dict(
+            benchmark(compiled_predict_one(model),
+                      lambda batch: model.predict(batch, batch_size=256, verbose=0), x_test, test_labels),
+            params=model.count_params(), size=os.path.getsize(path),
+        )
+
+    print(f"Evaluated on {len(x_test)} held-out images")
+    print(f"{'model':<8} {'params':>9} {'size KB':>9} {'latency ms':>11} {'images/s':>9} {'accuracy':>9}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['params']:>9} {result['size'] / 1024:>9.1f} {result['latency_ms']:>11.3f} "
+              f"{result['throughput']:>9.0f} {100 * result['accuracy']:>8.2f}%")
+
+    teacher, student = results["teacher"], results["student"]
+    print(f"Accuracy gap: {100 * (teacher['accuracy'] - student['accuracy']):.2f} points, "
+          f"{teacher['params'] / student['params']:.1f}x fewer parameters, "
+          f"{student['throughput'] / teacher['throughput']:.1f}x throughput")
+
+
+if __name__ == "__main__":
+    main()
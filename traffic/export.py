@@ -0,0 +1,220 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from traffic import IMG_HEIGHT, IMG_WIDTH, decode_images, list_images, read_split, split_indices
+
+CALIBRATION_SIZE = 500
+EVAL_SIZE = 2000
+
+
+def sample_images(data_dir, calibration_size, eval_size, split, seed=0):
+    """
+    Return tuple `(calibration, eval_images, eval_labels)` of random
+    samples of the images in `data_dir`, as uint8 arrays. `split` is the
+    split recorded for the model: calibration images come from its
+    training images and evaluation images from its held-out test images.
+    """
+    import numpy as np
+
+    paths, labels = list_images(data_dir)
+    if split["images"] != len(paths):
+        raise Exception(f"model was trained on {split['images']} images, {data_dir} has {len(paths)}")
+    train, test = split_indices(len(paths), split["test_size"], split["seed"])
+    rng = np.random.default_rng(seed)
+    calibration = rng.permutation(train)[:calibration_size]
+    evaluation = rng.permutation(test)[:eval_size]
+
+    calibration_images = np.array(decode_images([paths[i] for i in calibration]))
+    eval_images = np.array(decode_images([paths[i] for i in evaluation]))
+    eval_labels = np.array([labels[i] for i in evaluation])
+    return (calibration_images, eval_images, eval_labels)
+
+
+def convert(model, mode, calibration=None):
+    """
+    Convert Keras `model` to a TFLite flatbuffer.
+
+    `mode` is "float32" (no quantization), "dynamic" (int8 weights, float
+    activations) or "int8" (weights and activations quantized using the
+    `calibration` images, with uint8 input and output).
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if mode in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "int8":
+        def representative_dataset():
+            for image in calibration:
+                yield [image[None].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    return converter.convert()
+
+
+def make_interpreter(model_content):
+    """
+    Return an allocated TFLite interpreter, preferring the standalone
+    LiteRT package when it is installed.
+    """
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+
+    interpreter = Interpreter(model_content=model_content)
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+class TFLiteModel:
+    """
+    Wrap a TFLite interpreter so it classifies uint8 images like a Keras
+    model, quantizing inputs as the converted model expects.
+    """
+
+    def __init__(self, model_content):
+        self.interpreter = make_interpreter(model_content)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+
+
+    def predict_one(self, image):
+        import numpy as np
+
+        scale, zero_point = self.input["quantization"]
+        if scale:
+            image = np.round(image / scale + zero_point)
+        self.interpreter.set_tensor(self.input["index"], image[None].astype(self.input["dtype"]))
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output["index"])[0]
+
+
+    def predict(self, images):
+        import numpy as np
+        return np.array([self.predict_one(image) for image in images])
+
+
+def compiled_predict_one(model):
+    """
+    Return a function classifying one uint8 image with Keras `model`
+    through a compiled tf.function, as a serving process would. An eager
+    `model(image)` call mostly times Python dispatch, not the model.
+    """
+    import tensorflow as tf
+
+    predict = tf.function(
+        lambda x: model(x, training=False),
+        input_signature=[tf.TensorSpec((None, IMG_WIDTH, IMG_HEIGHT, 3), tf.uint8)],
+    )
+    return lambda image: predict(image[None]).numpy()[0]
+
+
+def latency_ms(predict_one, images, runs=200):
+    """
+    Return the median milliseconds `predict_one` takes per image over the
+    first `runs` of `images`, after one warm-up call.
+    """
+    import numpy as np
+
+    predict_one(images[0])
+    latencies = []
+    for image in images[:runs]:
+        start = time.perf_counter()
+        predict_one(image)
+        latencies.append(time.perf_counter() - start)
+    return 1000 * float(np.median(latencies))
+
+
+def benchmark(predict_one, predict_batch, images, labels, runs=200):
+    """
+    Return a dict with the median single-image latency, batch throughput
+    and accuracy of a model given as its two predict functions.
+    """
+    import numpy as np
+
+    latency = latency_ms(predict_one, images, runs)
+
+    # one untimed pass, so every batch shape is traced before timing
+    predict_batch(images)
+    start = time.perf_counter()
+    scores = predict_batch(images)
+    throughput = len(images) / (time.perf_counter() - start)
+
+    return {
+        "latency_ms": latency,
+        "throughput": throughput,
+        "accuracy": float(np.mean(np.argmax(scores, axis=1) == labels)),
+    }
+
+
+def saved_size(model):
+    """
+    Return the size in bytes of `model` saved as .h5 without its optimizer
+    state, which a training checkpoint carries but inference never needs.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.h5")
+        model.save(path, include_optimizer=False)
+        return os.path.getsize(path)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Export a traffic model to quantized TFLite and benchmark it")
+    parser.add_argument("model", help="model saved by `python traffic.py data_directory model.h5`, "
+                                      "which records its train/test split next to it")
+    parser.add_argument("data_directory", help="the images the model was trained on; calibration uses its "
+                                               "training images and evaluation its held-out test images")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--calibration", type=int, default=CALIBRATION_SIZE,
+                        help="number of images used to calibrate int8 activations")
+    parser.add_argument("--eval", type=int, default=EVAL_SIZE, help="number of evaluation images")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    split = read_split(args.model)
+    if split is None:
+        sys.exit(f"{args.model} has no recorded train/test split, so its held-out images are unknown; "
+                 f"retrain it with `python traffic.py data_directory {args.model}`")
+
+    model = tf.keras.models.load_model(args.model)
+    calibration, images, labels = sample_images(args.data_directory, args.calibration, args.eval, split)
+
+    results = {"keras": dict(
+        benchmark(compiled_predict_one(model), lambda batch: model.predict(batch, verbose=0), images, labels),
+        size=saved_size(model),
+    )}
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    base = os.path.splitext(os.path.basename(args.model))[0]
+    for mode in ("float32", "dynamic", "int8"):
+        content = convert(model, mode, calibration)
+        path = os.path.join(args.output_dir, f"{base}.{mode}.tflite")
+        with open(path, "wb") as f:
+            f.write(content)
+        print(f"Wrote {path}")
+
+        tflite = TFLiteModel(content)
+        results[f"tflite-{mode}"] = dict(
+            benchmark(tflite.predict_one, tflite.predict, images, labels), size=len(content)
+        )
+
+    print(f"Evaluated on {len(images)} held-out images of {IMG_WIDTH}x{IMG_HEIGHT}")
+    print(f"{'model':<16} {'size KB':>9} {'latency ms':>11} {'images/s':>9} {'accuracy':>9}")
+    for name, result in results.items():
+        print(f"{name:<16} {result['size'] / 1024:>9.1f} {result['latency_ms']:>11.3f} "
+              f"{result['throughput']:>9.0f} {100 * result['accuracy']:>8.2f}%")
+
+
+if __name__ == "__main__":
+    main()
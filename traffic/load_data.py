@@ -1,31 +1,20 @@
 import os
-import cv2
+import sys
+import time
 
-data_dir = "gtsrb"
-# img = cv.imread('messi5.jpg')
-if not data_dir in os.listdir(os.getcwd()):
-    raise Exception("Wrong directory path")
+from traffic import decode_images, list_images
 
-if not os.path.isdir(data_dir):
-    raise Exception("path is not a directory")
+data_dir = sys.argv[1] if len(sys.argv) > 1 else "gtsrb"
+worker_counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
 
-images = list()
-labels = list()
+# list every file once, so only decoding is timed
+paths, labels = list_images(data_dir)
+print(f"{len(paths)} images in {len(set(labels))} categories")
 
-for i in range(1):
-    if f"{i}" not in os.listdir(data_dir):
-        raise Exception(f"Directory Missing : {i}")
-    sign_dir = os.path.join(data_dir ,f"{i}")
-    for image in os.listdir(sign_dir):
-        try:
-            image_path = os.path.join(sign_dir , image)
-            img = cv2.imread(os.path.join(image_path))
-            resized_img = cv2.resize(img , (30 , 30))
-            resized_img = resized_img / 255.0
-            images.append(resized_img)
-            labels.append(i)
-        except:
-            raise Exception(f"Image not loadable : {os.path.join(sign_dir , image)}")
-        
-print(images)
-print(labels)
\ No newline at end of file
+baseline = None
+for workers in worker_counts:
+    start = time.perf_counter()
+    images = decode_images(paths, workers)
+    rate = len(images) / (time.perf_counter() - start)
+    baseline = baseline or rate
+    print(f"{workers:>3} workers: {rate:>8.0f} images/sec  {rate / baseline:>5.2f}x")
@@ -0,0 +1,111 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from traffic import decode_image, decode_images
+
+BATCH_SIZE = 256
+UNREADABLE = -1
+IMAGE_EXTENSIONS = (".ppm", ".png", ".jpg", ".jpeg", ".bmp")
+
+
+def find_images(image_dir):
+    """
+    Return the sorted paths of every image file under `image_dir`.
+    """
+    paths = list()
+    for root, _, files in os.walk(image_dir):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def decode_or_none(path):
+    """
+    Return the image at `path` decoded by `decode_image`, or None if it
+    cannot be read, so one bad file does not end a whole run.
+    """
+    try:
+        return decode_image(path)
+    except Exception as e:
+        print(f"Skipping {path}: {e}", file=sys.stderr)
+        return None
+
+
+def predict_images(model, paths, batch_size=BATCH_SIZE, workers=None):
+    """
+    Yield `(paths, classes, confidences)` for each batch of `paths`. An
+    image that cannot be read gets class UNREADABLE and confidence 0.
+
+    The next batch is decoded on `workers` threads while `model` predicts
+    the current one, so decoding and inference overlap.
+    """
+    import numpy as np
+
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    if not batches:
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        pending = prefetch.submit(decode_images, batches[0], workers, decode_or_none)
+        for n, batch in enumerate(batches):
+            images = pending.result()
+            if n + 1 < len(batches):
+                pending = prefetch.submit(decode_images, batches[n + 1], workers, decode_or_none)
+
+            classes = np.full(len(batch), UNREADABLE)
+            confidences = np.zeros(len(batch))
+            readable = [i for i, image in enumerate(images) if image is not None]
+            if readable:
+                scores = np.asarray(model.predict_on_batch(np.array([images[i] for i in readable])))
+                classes[readable] = scores.argmax(axis=1)
+                confidences[readable] = scores.max(axis=1)
+            yield (batch, classes, confidences)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Classify a directory of images with a saved traffic model")
+    parser.add_argument("model", help="model saved by `python traffic.py data_directory model.h5`")
+    parser.add_argument("image_directory")
+    parser.add_argument("output", help="CSV file for the predictions")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, help="image decoding threads")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    # Load the model once for every batch
+    model = tf.keras.models.load_model(args.model)
+    # images are decoded as raw 0-255 pixels, which only models that
+    # rescale their own input were trained on
+    if not isinstance(model.layers[0], tf.keras.layers.Rescaling):
+        sys.exit(f"{args.model} does not rescale its input pixels, so it was saved by an older traffic.py; "
+                 f"retrain it with `python traffic.py data_directory {args.model}`")
+    paths = find_images(args.image_directory)
+
+    unreadable = 0
+    start = time.perf_counter()
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "category", "confidence"])
+        for batch, classes, confidences in predict_images(model, paths, args.batch_size, args.workers):
+            unreadable += int((classes == UNREADABLE).sum())
+            writer.writerows(
+                (path, int(category), f"{confidence:.4f}")
+                for path, category, confidence in zip(batch, classes, confidences)
+            )
+    elapsed = time.perf_counter() - start
+
+    print(f"Classified {len(paths)} images in {elapsed:.2f}s ({len(paths) / elapsed:.0f} images/sec)")
+    if unreadable:
+        print(f"{unreadable} images could not be read, written with category {UNREADABLE}.")
+    print(f"Predictions written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import json
+import os
+import sys
+import time
+
+from traffic import IMG_HEIGHT, IMG_WIDTH, NUM_CATEGORIES, decode_images, split_indices
+
+MANIFEST = "manifest.json"
+
+
+def category_sources(sign_dir):
+    """
+    Return a dict mapping every file name in `sign_dir` to its
+    [size, mtime_ns], which identifies the version a shard was built from.
+    """
+    sources = dict()
+    for image in sorted(os.listdir(sign_dir)):
+        stat = os.stat(os.path.join(sign_dir, image))
+        sources[image] = [stat.st_size, stat.st_mtime_ns]
+    return sources
+
+
+def read_manifest(cache_dir):
+    """
+    Return the manifest in `cache_dir`, or an empty one if there is none
+    or it was built for a different image size.
+    """
+    empty = {"size": [IMG_WIDTH, IMG_HEIGHT], "categories": dict()}
+    try:
+        with open(os.path.join(cache_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty
+    return manifest if manifest.get("size") == empty["size"] else empty
+
+
+def write_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def build_shards(data_dir, cache_dir, workers=None):
+    """
+    Write every category of `data_dir` to `cache_dir` as a uint8 .npy shard
+    of shape (count, IMG_WIDTH, IMG_HEIGHT, 3).
+
+    The manifest records the size and mtime of each category's source
+    files, and only categories whose files changed are decoded again, on
+    `workers` threads.
+    Return the list of categories that were rebuilt.
+    """
+    import numpy as np
+
+    if not os.path.isdir(data_dir):
+        raise Exception("path is not a directory")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    manifest = read_manifest(cache_dir)
+    categories = set(os.listdir(data_dir))
+    rebuilt = list()
+
+    for i in range(NUM_CATEGORIES):
+        if f"{i}" not in categories:
+            raise Exception(f"Directory Missing : {i}")
+        sign_dir = os.path.join(data_dir, f"{i}")
+        sources = category_sources(sign_dir)
+        shard = f"{i}.npy"
+
+        entry = manifest["categories"].get(f"{i}")
+        if (entry is not None and entry["sources"] == sources
+                and os.path.exists(os.path.join(cache_dir, shard))):
+            continue
+
+        images = np.empty((len(sources), IMG_WIDTH, IMG_HEIGHT, 3), dtype=np.uint8)
+        paths = [os.path.join(sign_dir, image) for image in sources]
+        for n, image in enumerate(decode_images(paths, workers)):
+            images[n] = image
+
+        path = os.path.join(cache_dir, shard)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, images)
+        os.replace(path + ".tmp", path)
+
+        # record each category as soon as its shard is in place, so an
+        # interrupted build keeps the categories it finished
+        manifest["categories"][f"{i}"] = {"shard": shard, "count": len(sources), "sources": sources}
+        write_manifest(cache_dir, manifest)
+        rebuilt.append(i)
+
+    return rebuilt
+
+
+def open_shards(cache_dir):
+    """
+    Return tuple `(shards, labels)` for the shards in `cache_dir`.
+
+    `shards` is a list of read-only memory maps of the shard files in
+    category order, so no image is read until it is indexed, and
+    `labels` gives the category of each image from the manifest's
+    per-shard counts.
+    """
+    import numpy as np
+
+    manifest = read_manifest(cache_dir)
+    shards = list()
+    counts = list()
+    for i in range(NUM_CATEGORIES):
+        entry = manifest["categories"].get(f"{i}")
+        if entry is None:
+            raise Exception(f"Shard Missing : {i}")
+        shards.append(np.load(os.path.join(cache_dir, entry["shard"]), mmap_mode="r"))
+        counts.append(entry["count"])
+
+    labels = np.repeat(np.arange(NUM_CATEGORIES), counts)
+    return (shards, labels)
+
+
+def gather(shards, indices):
+    """
+    Return a uint8 array of the images at positions `indices` of the
+    concatenated `shards`, reading only those images from the maps.
+    """
+    import numpy as np
+
+    offsets = np.cumsum([0] + [len(shard) for shard in shards])
+    owners = np.searchsorted(offsets, indices, side="right") - 1
+    images = np.empty((len(indices), IMG_WIDTH, IMG_HEIGHT, 3), dtype=np.uint8)
+    for owner in np.unique(owners):
+        rows = owners == owner
+        images[rows] = shards[owner][indices[rows] - offsets[owner]]
+    return images
+
+
+def load_shards(cache_dir):
+    """
+    Return tuple `(images, labels)` read from the shards in `cache_dir`,
+    with `images` copied into one in-memory uint8 array in category
+    order. Use `shard_dataset` to train without holding every image.
+    """
+    import numpy as np
+
+    shards, labels = open_shards(cache_dir)
+    return (np.concatenate(shards), labels)
+
+
+def shard_dataset(cache_dir, batch_size=32, test_size=0.4, seed=0):
+    """
+    Return tuple `(train, test)` of batched `tf.data.Dataset`s over the
+    shards in `cache_dir`, yielding `(images, one_hot_labels)`.
+
+    Only indices and labels are held in memory: images are split by
+    `split_indices`, the same split as `load_dataset`, and each batch is
+    gathered from the memory-mapped shards, in parallel and prefetched
+    while the model trains.
+    """
+    import tensorflow as tf
+
+    shards, labels = open_shards(cache_dir)
+    train, test = split_indices(len(labels), test_size, seed)
+
+    def load(indices, batch_labels):
+        # read each shard front to back; order within a batch does not matter
+        order = tf.argsort(indices)
+        indices, batch_labels = tf.gather(indices, order), tf.gather(batch_labels, order)
+        images = tf.numpy_function(lambda i: gather(shards, i), [indices], tf.uint8)
+        images.set_shape((None, IMG_WIDTH, IMG_HEIGHT, 3))
+        return images, tf.one_hot(batch_labels, NUM_CATEGORIES)
+
+    def pipeline(indices, shuffle):
+        dataset = tf.data.Dataset.from_tensor_slices((indices, labels[indices]))
+        if shuffle:
+            dataset = dataset.shuffle(len(indices), seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size).map(load, num_parallel_calls=tf.data.AUTOTUNE)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    return (pipeline(train, True), pipeline(test, False))
+
+
+def main():
+
+    # Check command-line arguments
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python shards.py data_directory cache_directory")
+
+    start = time.perf_counter()
+    rebuilt = build_shards(sys.argv[1], sys.argv[2])
+    elapsed = time.perf_counter() - start
+
+    # sizes come from the maps' headers, so no image is read
+    shards, labels = open_shards(sys.argv[2])
+    print(f"Rebuilt {len(rebuilt)} of {NUM_CATEGORIES} categories in {elapsed:.2f}s")
+    print(f"{len(labels)} images, {sum(shard.nbytes for shard in shards) / 2 ** 20:.1f} MB as uint8")
+
+
+if __name__ == "__main__":
+    main()
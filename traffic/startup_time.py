@@ -0,0 +1,98 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Each project keeps its own copy of this script, since the projects in
+# this repo are self-contained directories; only MODULE differs
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODULE = "traffic"
+
+# Libraries that must only be imported by the code paths that use them
+HEAVY_MODULES = ["cv2", "numpy", "scipy", "sklearn", "tensorflow"]
+BUDGET_MS = 100
+
+
+def import_times(module):
+    """
+    Import `module` in a fresh interpreter under `python -X importtime`.
+    Return a list of (self_us, cumulative_us, name) tuples, one per
+    imported module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True, check=True
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times.append((int(own), int(cumulative), name.rstrip()))
+    return times
+
+
+def loaded_heavy_modules(module, heavy=HEAVY_MODULES):
+    """
+    Return the entries of `heavy` that importing `module` loads.
+    """
+    check = f"import sys, {module}; print(' '.join(m for m in {list(heavy)!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", check], cwd=HERE, capture_output=True, text=True, check=True
+    )
+    return result.stdout.split()
+
+
+def usage_error_ms(script, runs):
+    """
+    Return the median wall time in milliseconds of running `script` with
+    no arguments, which should fail fast with its usage message.
+    """
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script], cwd=HERE, capture_output=True)
+        samples.append(1000 * (time.perf_counter() - start))
+    return statistics.median(samples)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=f"Measure {MODULE}.py startup time")
+    parser.add_argument("--module", default=MODULE, help="module to import, in this directory")
+    parser.add_argument("--heavy", nargs="+", default=HEAVY_MODULES,
+                        help="modules the import must not load")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS,
+                        help="fail if the import takes longer")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    # best of several runs, since the first one also warms the disk cache
+    module = args.module
+    try:
+        runs = [import_times(module) for _ in range(args.runs)]
+    except subprocess.CalledProcessError as error:
+        lines = error.stderr.strip().splitlines()
+        sys.exit(f"import {module} failed in {HERE}: {lines[-1] if lines else error}")
+    times = min(runs, key=lambda run: next(c for _, c, n in run if n.strip() == module))
+    total = next(cumulative for _, cumulative, name in times if name.strip() == module) / 1000
+
+    print(f"import {module}: {total:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print("Slowest imports by self time:")
+    for own, cumulative, name in sorted(times, reverse=True)[:args.top]:
+        print(f"  {own / 1000:>7.1f} ms self {cumulative / 1000:>8.1f} ms cumulative  {name.strip()}")
+    script = f"{module}.py"
+    print(f"python {script} usage error: {usage_error_ms(script, args.runs):.1f} ms")
+
+    heavy = loaded_heavy_modules(module, args.heavy)
+    if heavy:
+        sys.exit(f"import {module} loads heavy modules: {', '.join(heavy)}")
+    if total > args.budget_ms:
+        sys.exit(f"import {module} exceeds the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
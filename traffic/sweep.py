@@ -0,0 +1,142 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from export import compiled_predict_one, latency_ms
+from traffic import IMG_HEIGHT, IMG_WIDTH, NUM_CATEGORIES, TEST_SIZE, get_model, split_indices
+
+EPOCHS = 2
+LATENCY_RUNS = 200
+
+
+def configurations(args):
+    """
+    Return the `get_model` keyword arguments for every point of the grid.
+    """
+    return [
+        {"filters": filters, "kernel": (kernel, kernel), "hidden": hidden, "conv_layers": conv_layers}
+        for filters, kernel, hidden, conv_layers in itertools.product(
+            args.filters, args.kernels, args.hidden, args.conv_layers
+        )
+    ]
+
+
+def run_trial(config, cache_dir, epochs, threads, seed=0):
+    """
+    Train a `get_model(**config)` network for `epochs` epochs on the shards
+    in `cache_dir` and evaluate it. Runs in its own process, limited to
+    `threads` TensorFlow threads so parallel trials do not compete.
+
+    Return a dict with the test accuracy, parameter count and training time.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    from shards import load_shards
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    tf.keras.utils.set_random_seed(seed)
+
+    images, labels = load_shards(cache_dir)
+    images, labels = np.asarray(images), tf.keras.utils.to_categorical(labels, NUM_CATEGORIES)
+    train, test = split_indices(len(labels), TEST_SIZE, seed)
+    x_train, x_test, y_train, y_test = images[train], images[test], labels[train], labels[test]
+
+    model = get_model(**config)
+    start = time.perf_counter()
+    model.fit(x_train, y_train, epochs=epochs, verbose=0)
+    train_seconds = time.perf_counter() - start
+    _, accuracy = model.evaluate(x_test, y_test, verbose=0)
+
+    return {
+        "config": config,
+        "accuracy": float(accuracy),
+        "params": int(model.count_params()),
+        "train_seconds": train_seconds,
+    }
+
+
+def measure_latency(config, runs=LATENCY_RUNS):
+    """
+    Return the median single-image CPU latency in milliseconds of a
+    `get_model(**config)` network, called through a compiled tf.function
+    as a serving process would. Latency does not depend on the weights,
+    so an untrained model is measured, one at a time with nothing else
+    running.
+    """
+    import numpy as np
+
+    images = np.zeros((runs, IMG_WIDTH, IMG_HEIGHT, 3), dtype=np.uint8)
+    return latency_ms(compiled_predict_one(get_model(**config)), images, runs)
+
+
+def pareto_front(results):
+    """
+    Return the results no other result beats on accuracy, latency and
+    parameter count at once, most accurate first.
+    """
+    def dominates(a, b):
+        no_worse = (a["accuracy"] >= b["accuracy"] and a["latency_ms"] <= b["latency_ms"]
+                    and a["params"] <= b["params"])
+        better = (a["accuracy"] > b["accuracy"] or a["latency_ms"] < b["latency_ms"]
+                  or a["params"] < b["params"])
+        return no_worse and better
+
+    front = [r for r in results if not any(dominates(other, r) for other in results)]
+    return sorted(front, key=lambda r: r["accuracy"], reverse=True)
+
+
+def describe(config):
+    kernel = config["kernel"][0]
+    return f"{config['conv_layers']}x conv{config['filters']} k{kernel} dense{config['hidden']}"
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Sweep get_model variants for accuracy versus CPU latency")
+    parser.add_argument("data_directory")
+    parser.add_argument("--cache", default="gtsrb_shards", help="shard directory, see shards.py")
+    parser.add_argument("--filters", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--kernels", type=int, nargs="+", default=[3])
+    parser.add_argument("--hidden", type=int, nargs="+", default=[0, 64, 128])
+    parser.add_argument("--conv-layers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--epochs", type=int, default=EPOCHS, help="training budget per variant")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--output", help="write every result and the Pareto front to this JSON file")
+    args = parser.parse_args()
+
+    from shards import build_shards
+    build_shards(args.data_directory, args.cache)
+
+    configs = configurations(args)
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+
+    # TensorFlow is not fork-safe, so every trial starts a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as executor:
+        results = list(executor.map(
+            run_trial, configs, itertools.repeat(args.cache), itertools.repeat(args.epochs),
+            itertools.repeat(threads)
+        ))
+
+    for result in results:
+        result["latency_ms"] = measure_latency(result["config"])
+
+    front = pareto_front(results)
+    print(f"{'model':<28} {'params':>9} {'latency ms':>11} {'accuracy':>9}  pareto")
+    for result in sorted(results, key=lambda r: r["latency_ms"]):
+        print(f"{describe(result['config']):<28} {result['params']:>9} {result['latency_ms']:>11.3f} "
+              f"{100 * result['accuracy']:>8.2f}%  {'*' if result in front else ''}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results, "pareto_front": front}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
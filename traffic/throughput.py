@@ -0,0 +1,135 @@
+import json
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident memory of this process in bytes, or None
+    where the `resource` module is not available, as on Windows.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else 1024 * peak
+
+
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """
+    Record training throughput per epoch and write it to a JSON report.
+
+    For every epoch the report has images/sec, step-time percentiles, the
+    time spent between steps and the process's peak resident memory.
+    Time between steps is Keras loop and callback overhead: input is
+    fetched inside the compiled step, so it does not show up there.
+
+    To tell whether training is input-bound, pass the training `dataset`.
+    After each epoch `input_batches` batches are drawn from it with no
+    model attached, giving the pipeline's own time per batch. When that
+    is longer than the median step, the pipeline cannot keep up. The
+    pipeline is timed without training competing for CPU, so it is a
+    lower bound on what it takes during training.
+
+    If `profile_steps` is a (start, stop) pair of global step numbers, a
+    TensorFlow profiler trace of those steps is written to `profile_dir`
+    for TensorBoard.
+    """
+
+    def __init__(self, batch_size, report_path, samples=None, profile_steps=None, profile_dir="logs/profile",
+                 dataset=None, input_batches=50):
+        super().__init__()
+        self.batch_size = batch_size
+        self.report_path = report_path
+        self.samples = samples
+        self.dataset = dataset
+        self.input_batches = input_batches
+        self.profile_steps = profile_steps
+        self.profile_dir = profile_dir
+        self.profiling = False
+        self.step = 0
+        self.epochs = []
+
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.perf_counter()
+        self.last_step_end = self.epoch_start
+        self.step_times = []
+        self.between_steps = 0.0
+
+
+    def on_train_batch_begin(self, batch, logs=None):
+        now = time.perf_counter()
+        self.between_steps += now - self.last_step_end
+        if self.profile_steps and self.step == self.profile_steps[0]:
+            tf.profiler.experimental.start(self.profile_dir)
+            self.profiling = True
+        self.step_start = now
+
+
+    def on_train_batch_end(self, batch, logs=None):
+        now = time.perf_counter()
+        self.step_times.append(now - self.step_start)
+        self.last_step_end = now
+        self.step += 1
+        if self.profiling and self.step >= self.profile_steps[1]:
+            self._stop_profiler()
+
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self.epoch_start
+        images = len(self.step_times) * self.batch_size
+        if self.samples is not None:
+            images = min(images, self.samples)
+        step_ms = 1000 * np.array(self.step_times)
+        input_ms = self._time_input() if self.dataset is not None else None
+
+        peak = peak_rss_bytes()
+        self.epochs.append({
+            "epoch": epoch + 1,
+            "seconds": seconds,
+            "images_per_second": images / seconds,
+            "steps": len(self.step_times),
+            "step_ms_p50": float(np.percentile(step_ms, 50)),
+            "step_ms_p90": float(np.percentile(step_ms, 90)),
+            "step_ms_p99": float(np.percentile(step_ms, 99)),
+            "between_steps_seconds": self.between_steps,
+            "between_steps_fraction": self.between_steps / seconds,
+            "input_ms_per_batch": input_ms,
+            "input_bound": None if input_ms is None else input_ms > float(np.percentile(step_ms, 50)),
+            "peak_rss_mb": None if peak is None else peak / 2**20,
+            "loss": float(logs["loss"]) if logs and "loss" in logs else None,
+        })
+
+
+    def on_train_end(self, logs=None):
+        if self.profiling:
+            self._stop_profiler()
+        with open(self.report_path, "w") as f:
+            json.dump({"batch_size": self.batch_size, "epochs": self.epochs}, f, indent=2)
+
+
+    def _time_input(self):
+        """
+        Return the milliseconds per batch the input pipeline takes alone,
+        over `input_batches` batches after the first.
+        """
+        batches = iter(self.dataset)
+        next(batches, None)
+        start = time.perf_counter()
+        count = 0
+        for _ in range(self.input_batches):
+            if next(batches, None) is None:
+                break
+            count += 1
+        return 1000 * (time.perf_counter() - start) / count if count else None
+
+
+    def _stop_profiler(self):
+        tf.profiler.experimental.stop()
+        self.profiling = False
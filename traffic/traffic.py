@@ -1,139 +1,305 @@
-import cv2
-import numpy as np
-import os
-import sys
-import tensorflow as tf
-
-from sklearn.model_selection import train_test_split
-
-EPOCHS = 10
-IMG_WIDTH = 30
-IMG_HEIGHT = 30
-NUM_CATEGORIES = 43
-TEST_SIZE = 0.4
-
-
-def main():
-
-    # Check command-line arguments
-    if len(sys.argv) not in [2, 3]:
-        sys.exit("Usage: python traffic.py data_directory [model.h5]")
-
-    # Get image arrays and labels for all image files
-    images, labels = load_data(sys.argv[1])
-
-    # Split data into training and testing sets
-    labels = tf.keras.utils.to_categorical(labels)
-    x_train, x_test, y_train, y_test = train_test_split(
-        np.array(images), np.array(labels), test_size=TEST_SIZE
-    )
-
-    # Get a compiled neural network
-    model = get_model()
-
-    # Fit model on training data
-    model.fit(x_train, y_train, epochs=EPOCHS)
-
-    # Evaluate neural network performance
-    model.evaluate(x_test,  y_test, verbose=2)
-
-    # Save model to file
-    if len(sys.argv) == 3:
-        filename = sys.argv[2]
-        model.save(filename)
-        print(f"Model saved to {filename}.")
-
-
-def load_data(data_dir):
-    """
-    Load image data from directory `data_dir`.
-
-    Assume `data_dir` has one directory named after each category, numbered
-    0 through NUM_CATEGORIES - 1. Inside each category directory will be some
-    number of image files.
-
-    Return tuple `(images, labels)`. `images` should be a list of all
-    of the images in the data directory, where each image is formatted as a
-    numpy ndarray with dimensions IMG_WIDTH x IMG_HEIGHT x 3. `labels` should
-    be a list of integer labels, representing the categories for each of the
-    corresponding `images`.
-    """
-    # img = cv.imread('messi5.jpg')
-    if not data_dir in os.listdir(os.getcwd()):
-        raise Exception("Wrong directory path")
-    
-    if not os.path.isdir(data_dir):
-        raise Exception("path is not a directory")
-    
-    images = list()
-    labels = list()
-
-    for i in range(NUM_CATEGORIES):
-        if f"{i}" not in os.listdir(data_dir):
-            raise Exception(f"Directory Missing : {i}")
-        sign_dir = os.path.join(data_dir ,f"{i}")
-        for image in os.listdir(sign_dir):
-            try:
-                image_path = os.path.join(sign_dir , image)
-                img = cv2.imread(os.path.join(image_path))
-                resized_img = cv2.resize(img , (IMG_WIDTH , IMG_HEIGHT))
-                resized_img = resized_img / 255.0
-                images.append(resized_img)
-                labels.append(i)
-            except:
-                raise Exception(f"Image not loadable : {os.path.join(sign_dir , image)}")
-            
-
-    return (images , labels)
-
-
-    
-
-
-def get_model():
-    """
-    Returns a compiled convolutional neural network model. Assume that the
-    `input_shape` of the first layer is `(IMG_WIDTH, IMG_HEIGHT, 3)`.
-    The output layer should have `NUM_CATEGORIES` units, one for each category.
-    """
-    # Create a convolutional neural network
-    NoOfFilters = 32
-    Kernel = (3, 3)
-    activation = "relu"
-    image_shape = (IMG_WIDTH, IMG_HEIGHT, 3)
-    pool = (2,2)
-    
-    model = tf.keras.models.Sequential([
-
-        # Convolutional layer. Learn 32 filters using a 3x3 kernel
-        tf.keras.layers.Conv2D(
-            32, (3, 3), activation="relu", input_shape=(IMG_WIDTH, IMG_HEIGHT, 3)
-        ),
-
-        # Max-pooling layer, using 2x2 pool size
-        tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
-
-        # Flatten units
-        tf.keras.layers.Flatten(),
-
-        # Add a hidden layer with dropout
-        tf.keras.layers.Dense(128, activation="relu"),
-        tf.keras.layers.Dropout(0.5),
-
-        # Add an output layer with output units for all categories
-        tf.keras.layers.Dense(NUM_CATEGORIES, activation="softmax")
-    ])
-
-    # Train neural network
-    model.compile(
-        optimizer="adam",
-        loss="categorical_crossentropy",
-        metrics=["accuracy"]
-    )
-
-    return model
-    raise NotImplementedError
-
-
-if __name__ == "__main__":
-    main()
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# cv2, numpy, tensorflow and sklearn take seconds to import, so each
+# function imports only what it needs once the arguments are checked
+
+EPOCHS = 10
+IMG_WIDTH = 30
+IMG_HEIGHT = 30
+NUM_CATEGORIES = 43
+TEST_SIZE = 0.4
+BATCH_SIZE = 32
+DECODE_CHUNK = 64
+
+
+def main():
+
+    # Check command-line arguments
+    parser = argparse.ArgumentParser(usage="python traffic.py data_directory [model.h5]")
+    parser.add_argument("data_directory")
+    parser.add_argument("model", nargs="?")
+    parser.add_argument("--stream", action="store_true",
+                        help="decode images in a tf.data pipeline instead of loading them all")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="train from memory-mapped uint8 shards in DIR, rebuilding changed categories first")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, help="image decoding threads")
+    parser.add_argument("--report", metavar="FILE",
+                        help="write per-epoch throughput, step times and memory to FILE as JSON")
+    parser.add_argument("--profile-steps", type=int, nargs=2, metavar=("START", "STOP"),
+                        help="capture a TensorFlow profiler trace of these training steps")
+    parser.add_argument("--profile-dir", default="logs/profile")
+    args = parser.parse_args()
+
+    import numpy as np
+    import tensorflow as tf
+
+    # Get a compiled neural network
+    model = get_model()
+
+    # Optionally record training throughput
+    def callbacks(samples=None, dataset=None):
+        if not (args.report or args.profile_steps):
+            return []
+        from throughput import ThroughputCallback
+        return [ThroughputCallback(
+            args.batch_size, args.report or "throughput.json", samples,
+            args.profile_steps, args.profile_dir, dataset
+        )]
+
+    if args.stream or args.cache:
+        if args.cache:
+            # Gather each batch straight from the memory-mapped shards
+            from shards import build_shards, shard_dataset
+            build_shards(args.data_directory, args.cache, args.workers)
+            train_data, test_data = shard_dataset(args.cache, args.batch_size)
+        else:
+            # Decode, batch and prefetch images while the model trains
+            train_data, test_data = load_dataset(args.data_directory, args.batch_size)
+        # the datasets split list_images order with split_indices, so this
+        # is their training count, and the last partial batch is not overcounted
+        train, _ = split_indices(len(list_images(args.data_directory)[0]))
+        model.fit(train_data, epochs=EPOCHS, callbacks=callbacks(len(train), train_data))
+        model.evaluate(test_data, verbose=2)
+
+    else:
+        # Get image arrays and labels for all image files
+        images, labels = load_data(args.data_directory, args.workers)
+
+        # Split data into training and testing sets
+        images = np.array(images)
+        labels = tf.keras.utils.to_categorical(labels, NUM_CATEGORIES)
+        train, test = split_indices(len(images))
+        x_train, x_test, y_train, y_test = images[train], images[test], labels[train], labels[test]
+
+        # Fit model on training data
+        model.fit(x_train, y_train, epochs=EPOCHS, batch_size=args.batch_size,
+                  callbacks=callbacks(len(x_train)))
+
+        # Evaluate neural network performance
+        model.evaluate(x_test,  y_test, verbose=2)
+
+    # Save model to file
+    if args.model:
+        filename = args.model
+        model.save(filename)
+        write_split(filename, len(list_images(args.data_directory)[0]))
+        print(f"Model saved to {filename}.")
+
+
+def load_data(data_dir, workers=None):
+    """
+    Load image data from directory `data_dir`.
+
+    Assume `data_dir` has one directory named after each category, numbered
+    0 through NUM_CATEGORIES - 1. Inside each category directory will be some
+    number of image files.
+
+    Return tuple `(images, labels)`. `images` should be a list of all
+    of the images in the data directory, where each image is formatted as a
+    numpy ndarray with dimensions IMG_WIDTH x IMG_HEIGHT x 3. `labels` should
+    be a list of integer labels, representing the categories for each of the
+    corresponding `images`.
+
+    Images are decoded by a pool of `workers` threads (OpenCV releases the
+    GIL), defaulting to one per CPU.
+    """
+    # img = cv.imread('messi5.jpg')
+    if not data_dir in os.listdir(os.getcwd()):
+        raise Exception("Wrong directory path")
+
+    # Decode on `workers` threads; results keep the order of `paths`
+    paths, labels = list_images(data_dir)
+    images = decode_images(paths, workers)
+
+    return (images , labels)
+
+
+def list_images(data_dir):
+    """
+    Return tuple `(paths, labels)` listing every image file in `data_dir`,
+    which is laid out as described in `load_data`, without reading any of
+    the images.
+    """
+    if not os.path.isdir(data_dir):
+        raise Exception("path is not a directory")
+
+    categories = set(os.listdir(data_dir))
+    paths = list()
+    labels = list()
+    for i in range(NUM_CATEGORIES):
+        if f"{i}" not in categories:
+            raise Exception(f"Directory Missing : {i}")
+        sign_dir = os.path.join(data_dir, f"{i}")
+        for image in sorted(os.listdir(sign_dir)):
+            paths.append(os.path.join(sign_dir, image))
+            labels.append(i)
+
+    return (paths, labels)
+
+
+def decode_image(path):
+    """
+    Read the image at `path` and return it resized to IMG_WIDTH x
+    IMG_HEIGHT x 3 as uint8. Scaling to [0, 1] happens inside the model.
+    """
+    import cv2
+
+    if isinstance(path, bytes):
+        path = path.decode()
+    img = cv2.imread(path)
+    if img is None:
+        raise Exception(f"Image not loadable : {path}")
+    resized_img = cv2.resize(img, (IMG_WIDTH, IMG_HEIGHT))
+    return resized_img
+
+
+def decode_images(paths, workers=None, decode=decode_image):
+    """
+    Return a list of the images at `paths`, decoded by `decode` on a pool
+    of `workers` threads, in the same order as `paths`.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [decode(path) for path in paths]
+
+    # hand out paths in chunks, as one task per small image costs more in
+    # scheduling than the decode itself
+    chunks = [paths[i:i + DECODE_CHUNK] for i in range(0, len(paths), DECODE_CHUNK)]
+    images = list()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in executor.map(lambda chunk: [decode(path) for path in chunk], chunks):
+            images.extend(chunk)
+    return images
+
+
+def split_indices(count, test_size=TEST_SIZE, seed=0):
+    """
+    Return tuple `(train, test)` of index arrays splitting `count` images,
+    in `list_images` order, by a seeded shuffle. Every training path uses
+    this split, so the test images of a saved model can be recovered.
+    """
+    import numpy as np
+
+    order = np.random.default_rng(seed).permutation(count)
+    split = int(count * (1 - test_size))
+    return (order[:split], order[split:])
+
+
+def split_path(model_path):
+    """
+    Return the path of the file recording the split `model_path` was
+    trained on.
+    """
+    return os.path.splitext(model_path)[0] + ".split.json"
+
+
+def write_split(model_path, count, test_size=TEST_SIZE, seed=0):
+    """
+    Record next to `model_path` that it was trained on the `split_indices`
+    split of `count` images.
+    """
+    with open(split_path(model_path), "w") as f:
+        json.dump({"seed": seed, "test_size": test_size, "images": count}, f)
+
+
+def read_split(model_path):
+    """
+    Return the split recorded next to `model_path`, or None if there is
+    none.
+    """
+    try:
+        with open(split_path(model_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_dataset(data_dir, batch_size=BATCH_SIZE, test_size=TEST_SIZE, seed=0):
+    """
+    Return tuple `(train, test)` of batched `tf.data.Dataset`s over the
+    images in `data_dir`, yielding `(images, one_hot_labels)`.
+
+    Only the file list is held in memory. Files are split into train and
+    test sets by shuffled index, then decoded and resized in parallel
+    (OpenCV releases the GIL) and prefetched while the model trains.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    paths, labels = list_images(data_dir)
+    paths = np.array(paths)
+    labels = np.array(labels)
+
+    train, test = split_indices(len(paths), test_size, seed)
+
+    def decode(path, label):
+        image = tf.numpy_function(decode_image, [path], tf.uint8)
+        image.set_shape((IMG_WIDTH, IMG_HEIGHT, 3))
+        return image, tf.one_hot(label, NUM_CATEGORIES)
+
+    def pipeline(indices, shuffle):
+        dataset = tf.data.Dataset.from_tensor_slices((paths[indices], labels[indices]))
+        if shuffle:
+            dataset = dataset.shuffle(len(indices), seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.map(decode, num_parallel_calls=tf.data.AUTOTUNE)
+        return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+    return (pipeline(train, True), pipeline(test, False))
+
+
+def get_model(filters=32, kernel=(3, 3), pool=(2, 2), hidden=128, dropout=0.5, conv_layers=1):
+    """
+    Returns a compiled convolutional neural network model. Assume that the
+    `input_shape` of the first layer is `(IMG_WIDTH, IMG_HEIGHT, 3)`.
+    The output layer should have `NUM_CATEGORIES` units, one for each category.
+
+    The defaults build one Conv2D(32)/MaxPool block and a Dense(128) hidden
+    layer. Each further block in `conv_layers` doubles the filters, and
+    `hidden=0` drops the hidden layer.
+    """
+    import tensorflow as tf
+
+    # Create a convolutional neural network
+    image_shape = (IMG_WIDTH, IMG_HEIGHT, 3)
+
+    # Scale uint8 pixels to [0, 1], so images can be stored as uint8
+    layers = [tf.keras.layers.Rescaling(1.0 / 255, input_shape=image_shape)]
+
+    for i in range(conv_layers):
+
+        # Convolutional layer. Learn `filters` filters using a `kernel` kernel
+        layers.append(tf.keras.layers.Conv2D(filters * 2 ** i, kernel, activation="relu"))
+
+        # Max-pooling layer, using `pool` pool size
+        layers.append(tf.keras.layers.MaxPooling2D(pool_size=pool))
+
+    # Flatten units
+    layers.append(tf.keras.layers.Flatten())
+
+    # Add a hidden layer with dropout
+    if hidden:
+        layers.append(tf.keras.layers.Dense(hidden, activation="relu"))
+        layers.append(tf.keras.layers.Dropout(dropout))
+
+    # Add an output layer with output units for all categories
+    layers.append(tf.keras.layers.Dense(NUM_CATEGORIES, activation="softmax"))
+
+    model = tf.keras.models.Sequential(layers)
+
+    # Train neural network
+    model.compile(
+        optimizer="adam",
+        loss="categorical_crossentropy",
+        metrics=["accuracy"]
+    )
+
+    return model
+    raise NotImplementedError
+
+
+if __name__ == "__main__":
+    main()